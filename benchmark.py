@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Stödlotsen – prestandamätning med syntetiska kataloger
+======================================================
+Kör: python benchmark.py
+     python benchmark.py --storlekar 29,1000 --varv 5
+     python benchmark.py --jamfor benchmark-resultat/tidigare.json
+     python benchmark.py --generera 10000 --ut stod-10000.json
+
+Bygger syntetiska stod.json i flera storlekar utifrån den riktiga
+databasen (samma språk, signaler och kategorier, fler orter och regioner),
+spelar upp en fast blandning av anrop mot sok_stod, stod_detaljer,
+lista_stod och stod_statistik och mäter p50/p95/p99, anrop per sekund och
+toppminne (tracemalloc) per verktyg. sok_stod mäts både utan resultatcache
+(varje sökning räknas om) och med varm cache, och redovisas var för sig. Resultatet sparas som JSON så att
+körningar kan jämföras över tid.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Lägg till rätt sökväg
+sys.path.insert(0, os.path.dirname(__file__))
+
+import server
+from server import lista_stod, sok_stod, stod_detaljer, stod_statistik
+
+STORLEKAR = [29, 1000, 10000, 100000]
+VARV = 3
+FRO = 20240229
+RESULTAT_DIR = Path(__file__).parent / "benchmark-resultat"
+
+LAN = [
+    "Stockholm", "Uppsala", "Södermanland", "Östergötland", "Jönköping", "Kronoberg",
+    "Kalmar", "Gotland", "Blekinge", "Skåne", "Halland", "Västra Götaland", "Värmland",
+    "Örebro", "Västmanland", "Dalarna", "Gävleborg", "Västernorrland", "Jämtland",
+    "Västerbotten", "Norrbotten",
+]
+KOMMUNER = [
+    "Ånge", "Sundsvall", "Kramfors", "Härnösand", "Sollefteå", "Örnsköldsvik", "Timrå",
+    "Umeå", "Luleå", "Kiruna", "Östersund", "Gävle", "Falun", "Karlstad", "Västerås",
+    "Eskilstuna", "Norrköping", "Linköping", "Växjö", "Kalmar", "Visby", "Karlskrona",
+    "Malmö", "Lund", "Helsingborg", "Halmstad", "Göteborg", "Borås", "Trollhättan",
+    "Jönköping", "Örebro", "Uppsala", "Södertälje", "Botkyrka", "Järfälla",
+]
+LOKALA_SIGNALER = ["bor i {ort}", "{ort}", "företag i {ort}", "flyttat till {ort}"]
+
+# Fast anropsblandning. Varje post är nyckelordsargument till verktyget.
+SOKNINGAR = [
+    {"fraga": "ensamstående mamma hyra"},
+    {"fraga": "Jag är ensamstående med två barn och har svårt att få ihop hyran"},
+    {"fraga": "svårt att betala hyran", "malgrupp": "privatperson"},
+    {"fraga": "starta företag arbetslös Ånge"},
+    {"fraga": "Jag driver en byggfirma i Ånge och vill investera i en ny maskin", "malgrupp": "företag"},
+    {"fraga": "bygga om badrum", "kategori": "bostad"},
+    {"fraga": "funktionsnedsättning kan inte arbeta"},
+    {"fraga": "föräldraledig barn", "region": "nationellt"},
+    {"fraga": "anställa nyanländ", "malgrupp": "företag", "region": "Västernorrland"},
+    {"fraga": "bostadbidrag ensamstaende"},
+    {"fraga": "forsakringskassan sjukskrivn"},
+    {"fraga": "vabba sjukt barn"},
+    {"fraga": "single parent rent help", "sprak": "en"},
+    {"fraga": "I'm a newcomer to Sweden and want to find support", "sprak": "en"},
+    {"fraga": "energy efficiency business", "malgrupp": "business", "sprak": "en"},
+    {"fraga": "مساعدة السكن", "sprak": "ar"},
+    {"fraga": "أم عزباء إيجار", "sprak": "ar"},
+    {"fraga": "studera universitet", "rankning": "bm25"},
+    {"fraga": "låg inkomst hyra", "rankning": "bm25", "format": "json"},
+    {"fraga": "investering maskin", "format": "json", "antal": 20},
+]
+LISTOR = [
+    {},
+    {"malgrupp": "privatperson"},
+    {"malgrupp": "företag", "sprak": "en"},
+    {"sprak": "ar"},
+    {"malgrupp": "privatperson", "format": "json"},
+]
+STATISTIK = [{}, {"format": "json"}]
+DETALJ_ANTAL = 20
+
+
+# ── Syntetiska kataloger ──────────────────────────────────────────
+
+
+def generera_katalog(antal: int, mallar: list[dict], fro: int = FRO) -> list[dict]:
+    """Syntetisk databas med ``antal`` stöd.
+
+    De första stöden är mallarna oförändrade; resten är lokala varianter av
+    dem med ort i namn, beskrivning och signaler, slumpad region och
+    verifieringsdatum samt några signaler och taggar lånade från andra stöd.
+    Samma frö ger samma katalog.
+    """
+    slump = random.Random(fro)
+    signaler = sorted({sig for m in mallar for sig in m["relevans_signaler"]})
+    taggar = sorted({t for m in mallar for t in m["taggar"]})
+    idag = date.today()
+
+    stod = [dict(m) for m in mallar[:antal]]
+    for i in range(len(stod), antal):
+        mall = mallar[i % len(mallar)]
+        ort = slump.choice(KOMMUNER)
+        lan = slump.choice(LAN)
+        s = dict(mall)
+        s["id"] = f"{mall['id']}-{i}"
+        s["namn"] = f"{mall['namn']} {ort}"
+        s["namn_en"] = f"{mall['namn_en']} {ort}"
+        s["namn_ar"] = f"{mall['namn_ar']} {ort}"
+        s["kort_beskrivning"] = f"{mall['kort_beskrivning']} Gäller i {ort}, {lan}."
+        s["kort_beskrivning_en"] = f"{mall['kort_beskrivning_en']} Applies in {ort}, {lan}."
+        s["kort_beskrivning_ar"] = f"{mall['kort_beskrivning_ar']} {ort}"
+        s["relevans_signaler"] = (
+            mall["relevans_signaler"]
+            + slump.sample(signaler, slump.randint(0, 3))
+            + [slump.choice(LOKALA_SIGNALER).format(ort=ort.lower())]
+        )
+        s["taggar"] = mall["taggar"] + slump.sample(taggar, slump.randint(0, 2))
+        s["region"] = slump.choice(["nationellt", "kommunalt", lan, lan])
+        s["senast_verifierad"] = (idag - timedelta(days=slump.randint(0, 730))).isoformat()
+        stod.append(s)
+    return stod
+
+
+def skriv_katalog(stod: list[dict], fil: Path) -> None:
+    with open(fil, "w", encoding="utf-8") as f:
+        json.dump(stod, f, ensure_ascii=False)
+
+
+def lasa_mallar() -> list[dict]:
+    if server.STOD_FILE.exists():
+        with open(server.STOD_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return server.EMBEDDED_STOD
+
+
+# ── Mätning ───────────────────────────────────────────────────────
+
+
+def percentil(varden: list[float], p: int) -> float:
+    """p:te percentilen (inklusiv interpolation), eller enda värdet."""
+    if len(varden) == 1:
+        return varden[0]
+    return statistics.quantiles(varden, n=100, method="inclusive")[p - 1]
+
+
+def mat_verktyg(verktyg, anrop: list[dict], varv: int) -> dict:
+    """Kör anropsblandningen ``varv`` gånger och sammanfattar tiderna.
+
+    Första anropet (som kan bygga cachar och förrenderad text) redovisas för
+    sig och ingår inte i percentilerna. Toppminnet mäts i ett separat varv
+    under tracemalloc, så att spårningen inte påverkar tiderna.
+    """
+    start = time.perf_counter()
+    verktyg(**anrop[0])
+    forsta = time.perf_counter() - start
+
+    tider = []
+    for _ in range(varv):
+        for kwargs in anrop:
+            start = time.perf_counter()
+            verktyg(**kwargs)
+            tider.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    for kwargs in anrop:
+        verktyg(**kwargs)
+    topp = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    summa = sum(tider)
+    return {
+        "anrop": len(tider),
+        "forsta_ms": round(forsta * 1000, 3),
+        "p50_ms": round(percentil(tider, 50) * 1000, 3),
+        "p95_ms": round(percentil(tider, 95) * 1000, 3),
+        "p99_ms": round(percentil(tider, 99) * 1000, 3),
+        "medel_ms": round(summa / len(tider) * 1000, 3),
+        "per_sekund": round(len(tider) / summa, 1) if summa else None,
+        "toppminne_kb": round(topp / 1024, 1),
+    }
+
+
+def mat_storlek(antal: int, mallar: list[dict], varv: int, cache: bool) -> dict:
+    """Genererar en katalog med ``antal`` stöd och mäter alla verktyg mot den.
+
+    "sok_stod" mäts utan resultatcache; med ``cache`` mäts sökningarna en
+    gång till med uppvärmd cache, som "sok_stod_cache", med cachens
+    träffkvot under mätningen.
+    """
+    stod = generera_katalog(antal, mallar)
+    slump = random.Random(FRO + antal)
+    detaljer = [
+        {"stod_id": s["id"], "sprak": sprak}
+        for s, sprak in zip(slump.sample(stod, min(DETALJ_ANTAL, len(stod))), ["sv", "en", "ar"] * DETALJ_ANTAL)
+    ]
+    detaljer.append({"stod_id": stod[0]["id"].upper()})
+    detaljer.append({"stod_id": "finns-inte"})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fil = Path(tmp) / "stod.json"
+        skriv_katalog(stod, fil)
+        # Verktygen slår upp katalog och sok_cache i server-modulen vid varje
+        # anrop, så nya objekt här gäller för alla anrop nedan.
+        server.katalog = server.Katalog(fil, [])
+        server.katalog.vid_ny_version.append(server.forrendering.bygg_i_bakgrunden)
+        server.sok_cache = server.Resultatcache(0, 0)
+
+        start = time.perf_counter()
+        server.katalog.hamta()
+        laddning = time.perf_counter() - start
+        # Listorna renderas i bakgrunden efter laddningen; vänta in dem så
+        # att tråden inte konkurrerar med mätningarna
+        start = time.perf_counter()
+        if server.forrendering.trad is not None:
+            server.forrendering.trad.join()
+        forrendering = time.perf_counter() - start
+
+        verktyg = {"sok_stod": mat_verktyg(sok_stod, SOKNINGAR, varv)}
+        if cache:
+            server.sok_cache = server.Resultatcache(server.CACHE_STORLEK, server.CACHE_TTL, server.CACHE_MAX_TRAFFAR)
+            # Värm upp cachen med hela blandningen, så att varvet bara mäter träffar
+            for kwargs in SOKNINGAR:
+                sok_stod(**kwargs)
+            fore = server.sok_cache.statistik()
+            verktyg["sok_stod_cache"] = mat_verktyg(sok_stod, SOKNINGAR, varv)
+            efter = server.sok_cache.statistik()
+            traffar, missar = efter["traffar"] - fore["traffar"], efter["missar"] - fore["missar"]
+            verktyg["sok_stod_cache"]["traffkvot"] = round(traffar / (traffar + missar), 3) if traffar + missar else None
+        verktyg["stod_detaljer"] = mat_verktyg(stod_detaljer, detaljer, varv)
+        verktyg["lista_stod"] = mat_verktyg(lista_stod, LISTOR, varv)
+        verktyg["stod_statistik"] = mat_verktyg(stod_statistik, STATISTIK, varv)
+
+    return {
+        "antal_stod": antal,
+        "laddning_s": round(laddning, 3),
+        "forrendering_s": round(forrendering, 3),
+        "numpy": server.katalog.hamta().matris is not None,
+        "cache": server.sok_cache.statistik(),
+        "verktyg": verktyg,
+    }
+
+
+def git_version() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ── Utskrift ──────────────────────────────────────────────────────
+
+
+def skriv_tabell(resultat: dict, tidigare: dict | None = None) -> None:
+    print(f"\n  {resultat['antal_stod']} stöd — laddning {resultat['laddning_s']:.2f} s"
+          f"{' (NumPy)' if resultat['numpy'] else ''}, förrendering {resultat.get('forrendering_s', 0):.2f} s")
+    print(f"  {'verktyg':<16}{'anrop':>7}{'första':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'anrop/s':>10}{'minne':>10}")
+    for namn, r in resultat["verktyg"].items():
+        rad = (f"  {namn:<16}{r['anrop']:>7}{r['forsta_ms']:>8.2f}ms{r['p50_ms']:>7.2f}ms"
+               f"{r['p95_ms']:>7.2f}ms{r['p99_ms']:>7.2f}ms{r['per_sekund'] or 0:>10.0f}{r['toppminne_kb']:>8.0f}kB")
+        if tidigare and namn in tidigare.get("verktyg", {}) and tidigare["verktyg"][namn]["p50_ms"]:
+            kvot = r["p50_ms"] / tidigare["verktyg"][namn]["p50_ms"]
+            rad += f"  p50 ×{kvot:.2f}"
+        if r.get("traffkvot") is not None:
+            rad += f"  cacheträffar {r['traffkvot']:.0%}"
+        print(rad)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prestandamätning av Stödlotsens verktyg")
+    parser.add_argument("--storlekar", default=",".join(map(str, STORLEKAR)),
+                        help="kommaseparerade katalogstorlekar (förval: %(default)s)")
+    parser.add_argument("--varv", type=int, default=VARV, help="antal varv genom anropsblandningen")
+    parser.add_argument("--utan-cache", action="store_true", help="mät inte sok_stod med varm resultatcache")
+    parser.add_argument("--ut", type=Path, help="resultatfil (förval: benchmark-resultat/<tid>.json)")
+    parser.add_argument("--jamfor", type=Path, help="tidigare resultatfil att jämföra p50 mot")
+    parser.add_argument("--generera", type=int, metavar="ANTAL",
+                        help="skriv bara en syntetisk katalog med ANTAL stöd till --ut")
+    args = parser.parse_args()
+
+    mallar = lasa_mallar()
+
+    if args.generera:
+        ut = args.ut or Path(f"stod-{args.generera}.json")
+        skriv_katalog(generera_katalog(args.generera, mallar), ut)
+        print(f"Skrev {args.generera} stöd till {ut}")
+        return 0
+
+    tidigare = {}
+    if args.jamfor:
+        with open(args.jamfor, encoding="utf-8") as f:
+            tidigare = {r["antal_stod"]: r for r in json.load(f)["storlekar"]}
+
+    korning = {
+        "tid": datetime.now().isoformat(timespec="seconds"),
+        "git": git_version(),
+        "python": platform.python_version(),
+        "plattform": platform.platform(),
+        "numpy": server.np is not None,
+        "vektor_troskel": server.VEKTOR_TROSKEL,
+        "varv": args.varv,
+        "cache": not args.utan_cache,
+        "storlekar": [],
+    }
+    for antal in (int(s) for s in args.storlekar.split(",") if s.strip()):
+        resultat = mat_storlek(antal, mallar, args.varv, not args.utan_cache)
+        korning["storlekar"].append(resultat)
+        skriv_tabell(resultat, tidigare.get(antal))
+
+    ut = args.ut or RESULTAT_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    ut.parent.mkdir(parents=True, exist_ok=True)
+    with open(ut, "w", encoding="utf-8") as f:
+        json.dump(korning, f, ensure_ascii=False, indent=2)
+    print(f"\n  Resultat sparat i {ut}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Stödlotsen – relevanstest mot guldfrågor
+========================================
+Kör: python relevanstest.py
+     python relevanstest.py --k 3 --ut relevans.json
+     python relevanstest.py --jamfor relevans.json   # misslyckas vid försämring
+
+Rangordnar varje fråga i data/guldfragor.json med varje poängsättare —
+berakna_relevans (den ursprungliga linjära genomgången), det inverterade
+indexet, term–dokument-matrisen (om NumPy finns) och BM25 — och räknar
+precision@k, recall@k och NDCG@k mot de förväntade stöden, tillsammans med
+svarstiden. Med --jamfor jämförs mot en tidigare körning, och skriptet
+avslutas med fel om kvaliteten sjunkit eller tiden ökat mer än tillåtet.
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Lägg till rätt sökväg
+sys.path.insert(0, os.path.dirname(__file__))
+
+import server
+from server import Rangordning, TermDokumentMatris, berakna_relevans, normalisera
+
+GULDFRAGOR = server.DATA_DIR / "guldfragor.json"
+K = 5
+VARV = 5
+
+
+# ── Poängsättare ──────────────────────────────────────────────────
+
+
+def skatta_linjart(version, fraga: str, urval) -> dict[int, float]:
+    """berakna_relevans() på varje stöd, som sok_stod gjorde före indexet."""
+    sokord = set(fraga.split())
+    poang = {}
+    for dok, stod in enumerate(version.stod):
+        if urval is None or dok in urval:
+            p = berakna_relevans(stod, fraga, sokord)
+            if p > 0:
+                poang[dok] = p
+    return poang
+
+
+def skatta_index(version, fraga: str, urval) -> dict[int, float]:
+    """Klassisk rankning via det inverterade indexet, i ren Python."""
+    return version.index.poang(version.analysator.analysera_fraga(fraga), urval)
+
+
+_matriser: dict[str, TermDokumentMatris] = {}
+
+
+def skatta_matris(version, fraga: str, urval) -> dict[int, float]:
+    """Klassisk rankning via term–dokument-matrisen, oavsett katalogens storlek."""
+    matris = _matriser.get(version.version)
+    if matris is None:
+        matris = _matriser[version.version] = TermDokumentMatris(version.index, len(version.stod))
+    return matris.poang(version.index.fragevikter(version.analysator.analysera_fraga(fraga)), urval)
+
+
+def skatta_bm25(version, fraga: str, urval) -> dict[int, float]:
+    return server.RANKNINGAR["bm25"](version, fraga, urval)
+
+
+SKATTARE = {
+    "berakna_relevans": skatta_linjart,
+    "index": skatta_index,
+    "matris": skatta_matris,
+    "bm25": skatta_bm25,
+}
+if server.np is None:
+    del SKATTARE["matris"]
+
+
+# ── Mått ──────────────────────────────────────────────────────────
+
+
+def ndcg(rangordnade: list[str], relevanta: dict[str, int], k: int) -> float:
+    """Normaliserad DCG för de k första, med graderad relevans (2^rel - 1)."""
+    dcg = sum((2 ** relevanta.get(stod_id, 0) - 1) / math.log2(i + 2) for i, stod_id in enumerate(rangordnade[:k]))
+    ideal = sorted(relevanta.values(), reverse=True)[:k]
+    idcg = sum((2**rel - 1) / math.log2(i + 2) for i, rel in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def las_guldfragor(fil: Path) -> list[dict]:
+    """Guldfrågorna; ``relevanta`` kan vara en lista (grad 1) eller id → grad."""
+    with open(fil, encoding="utf-8") as f:
+        fragor = json.load(f)
+    for fraga in fragor:
+        if isinstance(fraga["relevanta"], list):
+            fraga["relevanta"] = {stod_id: 1 for stod_id in fraga["relevanta"]}
+    return fragor
+
+
+def utvardera(version, fragor: list[dict], skattare, k: int, varv: int) -> dict:
+    """Medelvärden av P@k, recall@k och NDCG@k samt svarstider för en poängsättare."""
+    precision, recall, ndcg_varden, tider, per_fraga = [], [], [], [], []
+    for fraga in fragor:
+        fraga_norm = " ".join(normalisera(fraga["fraga"]).split())
+        urval = version.filter.urval(
+            normalisera(fraga.get("malgrupp", "")), normalisera(fraga.get("kategori", "")), normalisera(fraga.get("region", ""))
+        )
+        tid = []
+        for _ in range(varv):
+            # Analysen memoiseras; töm den så att varje varv mäter hela sökningen
+            version.analysator.analysera_fraga.cache_clear()
+            start = time.perf_counter()
+            poang = skattare(version, fraga_norm, urval)
+            topp = Rangordning((), poang).topp(k)
+            tid.append(time.perf_counter() - start)
+        tider.append(statistics.median(tid))
+
+        ids = [version.stod[dok]["id"] for _, dok in topp]
+        relevanta = fraga["relevanta"]
+        traffar = sum(stod_id in relevanta for stod_id in ids)
+        precision.append(traffar / k)
+        recall.append(traffar / len(relevanta))
+        ndcg_varden.append(ndcg(ids, relevanta, k))
+        per_fraga.append({"fraga": fraga["fraga"], "ndcg": round(ndcg_varden[-1], 3), "topp": ids})
+
+    ms = sorted(t * 1000 for t in tider)
+    return {
+        f"p@{k}": round(statistics.mean(precision), 4),
+        f"recall@{k}": round(statistics.mean(recall), 4),
+        f"ndcg@{k}": round(statistics.mean(ndcg_varden), 4),
+        "medel_ms": round(statistics.mean(ms), 4),
+        "p95_ms": round(statistics.quantiles(ms, n=100, method="inclusive")[94], 4) if len(ms) > 1 else round(ms[0], 4),
+        "fragor": per_fraga,
+    }
+
+
+def jamfor(resultat: dict, tidigare: dict, tolerans: float, max_langsammare: float) -> list[str]:
+    """Försämringar jämfört med en tidigare körning, som läsbara rader."""
+    fel = []
+    for namn, r in resultat["skattare"].items():
+        gammal = tidigare.get("skattare", {}).get(namn)
+        if gammal is None:
+            continue
+        for matt in r:
+            if "@" in matt and matt in gammal and r[matt] < gammal[matt] - tolerans:
+                fel.append(f"{namn}: {matt} sjönk från {gammal[matt]:.3f} till {r[matt]:.3f}")
+        if gammal.get("medel_ms") and r["medel_ms"] > gammal["medel_ms"] * max_langsammare:
+            fel.append(f"{namn}: medeltiden ökade från {gammal['medel_ms']:.3f} till {r['medel_ms']:.3f} ms")
+    return fel
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Relevanstest av Stödlotsens poängsättare mot guldfrågor")
+    parser.add_argument("--guldfragor", type=Path, default=GULDFRAGOR, help="fil med guldfrågor (förval: %(default)s)")
+    parser.add_argument("--k", type=int, default=K, help="antal träffar som bedöms (förval: %(default)s)")
+    parser.add_argument("--varv", type=int, default=VARV, help="körningar per fråga för tidmätning")
+    parser.add_argument("--skattare", default=",".join(SKATTARE), help="kommaseparerade poängsättare")
+    parser.add_argument("--visa", action="store_true", help="visa NDCG och topplista per fråga")
+    parser.add_argument("--ut", type=Path, help="spara resultatet som JSON")
+    parser.add_argument("--jamfor", type=Path, help="tidigare resultat; avsluta med fel vid försämring")
+    parser.add_argument("--tolerans", type=float, default=0.01, help="tillåten sänkning av P, recall och NDCG")
+    parser.add_argument("--max-langsammare", type=float, default=2.0, help="tillåten ökning av medeltiden (faktor)")
+    args = parser.parse_args()
+
+    fragor = las_guldfragor(args.guldfragor)
+    version = server.katalog.hamta()
+    saknade = sorted({i for f in fragor for i in f["relevanta"]} - {s["id"] for s in version.stod})
+    if saknade:
+        print(f"Okända ID:n i {args.guldfragor}: {', '.join(saknade)}")
+        return 1
+
+    resultat = {"katalogversion": version.version, "k": args.k, "antal_fragor": len(fragor), "skattare": {}}
+    k = args.k
+    print(f"\n  {len(fragor)} guldfrågor, k = {k}\n")
+    print(f"  {'poängsättare':<18}{f'P@{k}':>8}{f'R@{k}':>8}{f'NDCG@{k}':>9}{'medel':>10}{'p95':>10}")
+    for namn in args.skattare.split(","):
+        r = utvardera(version, fragor, SKATTARE[namn], k, args.varv)
+        resultat["skattare"][namn] = r
+        print(f"  {namn:<18}{r[f'p@{k}']:>8.3f}{r[f'recall@{k}']:>8.3f}{r[f'ndcg@{k}']:>9.3f}"
+              f"{r['medel_ms']:>8.3f}ms{r['p95_ms']:>8.3f}ms")
+        if args.visa:
+            for f in r["fragor"]:
+                print(f"      {f['ndcg']:.2f}  {f['fraga']}  →  {', '.join(f['topp'][:3])}")
+
+    if args.ut:
+        with open(args.ut, "w", encoding="utf-8") as f:
+            json.dump(resultat, f, ensure_ascii=False, indent=2)
+        print(f"\n  Resultat sparat i {args.ut}")
+
+    if args.jamfor:
+        with open(args.jamfor, encoding="utf-8") as f:
+            tidigare = json.load(f)
+        if tidigare.get("k") != k:
+            print(f"\n  Kan inte jämföra: {args.jamfor} har k = {tidigare.get('k')}.")
+            return 1
+        fel = jamfor(resultat, tidigare, args.tolerans, args.max_langsammare)
+        if fel:
+            print("\n  Försämringar:")
+            for rad in fel:
+                print(f"    ✗ {rad}")
+            return 1
+        print(f"\n  Ingen försämring jämfört med {args.jamfor}.")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
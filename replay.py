@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Stödlotsen – spela upp en frågelogg
+===================================
+Kör: python replay.py fragelogg.jsonl
+     python replay.py fragelogg.jsonl.1 fragelogg.jsonl --rankning bm25
+     python replay.py fragelogg.jsonl --katalog stod-10000.json --ut rapport.json
+
+Kör varje sökning i en frågelogg (se STODLOTSEN_FRAGELOGG i README) mot
+valfri katalog och rankning, utan resultatcache, och jämför svarstider och
+träffar med det som loggades: samma stöd i samma ordning, samma stöd i annan
+ordning eller andra stöd. Sökningar där loggen bytt ut ord eller nummer
+mot platshållare (<namn>, <nummer>, …) är inte samma fråga som användaren
+ställde och räknas för sig. Samma logg och inställningar ger alltid samma
+resultat.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Lägg till rätt sökväg
+sys.path.insert(0, os.path.dirname(__file__))
+
+import server
+from server import sok, sok_data
+
+PLATSHALLARE_RE = re.compile(r"<(?:url|epost|nummer|namn)>")
+
+
+def las_logg(filer: list[Path]) -> tuple[list[dict], int]:
+    """Posterna i loggfilerna i tur och ordning, och antal trasiga rader."""
+    poster, trasiga = [], 0
+    for fil in filer:
+        with open(fil, encoding="utf-8") as f:
+            for rad in f:
+                if not rad.strip():
+                    continue
+                try:
+                    post = json.loads(rad)
+                except ValueError:
+                    trasiga += 1
+                    continue
+                if isinstance(post, dict) and "fraga" in post:
+                    poster.append(post)
+                else:
+                    trasiga += 1
+    return poster, trasiga
+
+
+def spela_upp(post: dict, version, rankning: str | None, varv: int) -> dict:
+    """Kör en loggad sökning och jämför med det loggade svaret."""
+    rank = rankning or post.get("rankning") or server.STANDARD_RANKNING
+    start, antal = post.get("start", 0), post.get("antal", server.SOK_ANTAL)
+    tider = []
+    for _ in range(varv):
+        tid = time.perf_counter()
+        fraga_norm, resultat = sok(
+            version, post["fraga"], post.get("malgrupp", ""), post.get("kategori", ""), post.get("region", ""), rank
+        )
+        data = sok_data(version, fraga_norm, resultat, post.get("sprak", "sv"), antal, start)
+        tider.append(time.perf_counter() - tid)
+
+    ids = [r["id"] for r in data["resultat"]]
+    loggade = post.get("ids", [])
+    if ids == loggade:
+        utfall = "samma"
+    elif sorted(ids) == sorted(loggade):
+        utfall = "annan_ordning"
+    else:
+        utfall = "andra_stod"
+    return {
+        "fraga": post["fraga"],
+        "rankning": rank,
+        "utfall": utfall,
+        "platshallare": bool(PLATSHALLARE_RE.search(post["fraga"])),
+        "ms": round(statistics.median(tider) * 1000, 3),
+        "loggad_ms": post.get("ms"),
+        "traffar": data["antal"],
+        "loggade_traffar": post.get("traffar"),
+        "nya": [i for i in ids if i not in loggade],
+        "borta": [i for i in loggade if i not in ids],
+    }
+
+
+def percentiler(varden: list[float]) -> dict:
+    if not varden:
+        return {}
+    if len(varden) == 1:
+        return {"p50": round(varden[0], 3), "p95": round(varden[0], 3), "p99": round(varden[0], 3)}
+    q = statistics.quantiles(varden, n=100, method="inclusive")
+    return {"p50": round(q[49], 3), "p95": round(q[94], 3), "p99": round(q[98], 3)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Spela upp en frågelogg mot en katalog och rankning")
+    parser.add_argument("logg", type=Path, nargs="+", help="loggfiler, äldst först")
+    parser.add_argument("--katalog", type=Path, help="stod.json att söka i (förval: data/stod.json)")
+    parser.add_argument("--rankning", choices=list(server.RANKNINGAR), help="rankning för alla sökningar (förval: den loggade)")
+    parser.add_argument("--varv", type=int, default=1, help="kör varje sökning så många gånger och ta mediantiden")
+    parser.add_argument("--visa", type=int, default=10, help="antal sökningar med ändrade träffar att skriva ut")
+    parser.add_argument("--ut", type=Path, help="spara rapporten som JSON")
+    args = parser.parse_args()
+
+    for fil in [*args.logg, *([args.katalog] if args.katalog else [])]:
+        if not fil.is_file():
+            print(f"Filen {fil} finns inte.")
+            return 1
+
+    poster, trasiga = las_logg(args.logg)
+    if not poster:
+        print("Inga sökningar i loggen.")
+        return 1
+
+    if args.katalog:
+        server.katalog = server.Katalog(args.katalog, [])
+    # Varje sökning ska räknas om, inte hämtas ur cachen
+    server.sok_cache = server.Resultatcache(0, 0)
+    version = server.katalog.hamta()
+
+    # Första sökningen bygger lata strukturer; den ska inte räknas in
+    spela_upp(poster[0], version, args.rankning, 1)
+    utfall = [spela_upp(post, version, args.rankning, max(1, args.varv)) for post in poster]
+
+    typer = ("samma", "annan_ordning", "andra_stod")
+    hela = [u for u in utfall if not u["platshallare"]]
+    antal = {typ: sum(u["utfall"] == typ for u in hela) for typ in typer}
+    med_platshallare = {typ: sum(u["utfall"] == typ for u in utfall if u["platshallare"]) for typ in typer}
+    loggade_versioner = sorted({p.get("version") for p in poster if p.get("version")})
+    rapport = {
+        "sokningar": len(utfall),
+        "trasiga_rader": trasiga,
+        "katalogversion": version.version,
+        "loggade_versioner": loggade_versioner,
+        "rankning": args.rankning,
+        "utfall": antal,
+        "utfall_med_platshallare": med_platshallare,
+        "ms": percentiler([u["ms"] for u in utfall]),
+        "loggad_ms": percentiler([u["loggad_ms"] for u in utfall if u["loggad_ms"] is not None]),
+        "andrade": [u for u in hela if u["utfall"] != "samma"],
+    }
+
+    print(f"\n  {len(utfall)} sökningar mot katalog {version.version}"
+          f" (loggade mot {', '.join(loggade_versioner) or 'okänd'})"
+          + (f", {trasiga} trasiga rader hoppades över" if trasiga else ""))
+    print(f"  rankning: {args.rankning or 'som loggat'}\n")
+    print(f"  {'':<12}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for namn, p in (("uppspelad", rapport["ms"]), ("loggad", rapport["loggad_ms"])):
+        if p:
+            print(f"  {namn:<12}{p['p50']:>8.2f}ms{p['p95']:>8.2f}ms{p['p99']:>8.2f}ms")
+    print(f"\n  samma träffar:        {antal['samma']}")
+    print(f"  samma, annan ordning: {antal['annan_ordning']}")
+    print(f"  andra stöd:           {antal['andra_stod']}")
+    if sum(med_platshallare.values()):
+        print(f"  med platshållare:     {sum(med_platshallare.values())}"
+              f" ({med_platshallare['samma']} samma, {med_platshallare['annan_ordning']} annan ordning,"
+              f" {med_platshallare['andra_stod']} andra stöd — räknas inte som ändrade)")
+    for u in rapport["andrade"][: args.visa]:
+        print(f"\n  \"{u['fraga']}\" ({u['utfall']}, {u['loggade_traffar']} → {u['traffar']} träffar)")
+        if u["nya"]:
+            print(f"    + {', '.join(u['nya'])}")
+        if u["borta"]:
+            print(f"    − {', '.join(u['borta'])}")
+
+    if args.ut:
+        with open(args.ut, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, ensure_ascii=False, indent=2)
+        print(f"\n  Rapport sparad i {args.ut}")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
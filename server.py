@@ -10,18 +10,56 @@ Kräver: pip install mcp
 Kör: python server.py (via MCP-klient)
 """
 
+import atexit
+import base64
+import bisect
+import functools
+import hashlib
+import heapq
 import json
+import math
 import os
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from datetime import date, datetime
 from pathlib import Path
+from typing import NamedTuple
 
 from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+try:
+    import numpy as np
+except ImportError:  # Valfritt — behövs bara för vektoriserad poängsättning
+    np = None
 
 # ── Konfiguration ─────────────────────────────────────────────────
 
 DATA_DIR = Path(__file__).parent / "data"
 STOD_FILE = DATA_DIR / "stod.json"
+SYNONYM_FILE = DATA_DIR / "synonymer.json"
 SUPPORTED_LANGUAGES = {"sv": "svenska", "en": "English", "ar": "العربية"}
+STANDARD_RANKNING = os.environ.get("STODLOTSEN_RANKNING", "klassisk")
+# Från hur många stöd klassisk rankning räknas i NumPy (om det finns installerat)
+VEKTOR_TROSKEL = int(os.environ.get("STODLOTSEN_VEKTOR_TROSKEL", 2000))
+# Resultatcache för sok_stod: max antal frågor, max antal poängsatta stöd
+# sammanlagt i alla cachade frågor (varje träff kostar minnet) och livslängd i sekunder
+CACHE_STORLEK = int(os.environ.get("STODLOTSEN_CACHE_STORLEK", 1024))
+CACHE_MAX_TRAFFAR = int(os.environ.get("STODLOTSEN_CACHE_MAX_TRAFFAR", 500_000))
+CACHE_TTL = float(os.environ.get("STODLOTSEN_CACHE_TTL", 600))
+# Frågelogg för sok_stod (opt-in): fil, maxstorlek i byte och antal roterade filer
+FRAGELOGG = os.environ.get("STODLOTSEN_FRAGELOGG", "")
+FRAGELOGG_STORLEK = int(os.environ.get("STODLOTSEN_FRAGELOGG_STORLEK", 10_000_000))
+FRAGELOGG_ANTAL = int(os.environ.get("STODLOTSEN_FRAGELOGG_ANTAL", 5))
+# Antal träffar per sida i sok_stod: standard och max
+SOK_ANTAL = 8
+SOK_MAX_ANTAL = 50
+# Stöd som inte verifierats på så här många dagar flaggas som inaktuella
+INAKTUELL_EFTER_DAGAR = 180
 
 
 # ── Inbakad databas (fallback om data/stod.json saknas) ─────────
@@ -49,7 +87,7 @@ EMBEDDED_STOD = [
     "villkor": [
       "Barnfamilj (oavsett ålder) eller person 18-28 år utan barn",
       "Inkomst under viss gräns beroende på familjestorlek",
-      "Boendekostnad som överstiger viss nivå i förhållande till inkomst",
+      "Boendekostnad som överstiger viss niva i förhållande till inkomst",
       "Folkbokförd i Sverige"
     ],
     "belopp": "Varierar beroende på inkomst, hyra och antal barn. Upp till ca 5 300 kr/mån för barnfamiljer.",
@@ -359,7 +397,7 @@ EMBEDDED_STOD = [
       "Merkostnader över 14 800 kr/år",
       "Kostnaderna ska bero på funktionsnedsättningen"
     ],
-    "belopp": "5 nivåer: från ca 1 190 till 3 563 kr/mån.",
+    "belopp": "5 nivaer: från ca 1 190 till 3 563 kr/mån.",
     "ansokan_url": "https://www.forsakringskassan.se/privatperson/funktionsnedsattning/merkostnadsersattning-for-vuxna",
     "info_url": "https://www.forsakringskassan.se/privatperson/funktionsnedsattning/merkostnadsersattning-for-vuxna",
     "relevans_signaler": [
@@ -830,7 +868,7 @@ EMBEDDED_STOD = [
     "villkor": [
       "Dagligvarubutik eller drivmedelsanläggning",
       "Gles- eller landsbygd",
-      "Bidrar till god servicenivå"
+      "Bidrar till god serviceniva"
     ],
     "belopp": "Varierar.",
     "ansokan_url": "https://www.rvn.se/sv/utveckla-vasternorrland/stod-och-finansiering/foretagsstod/",
@@ -986,7 +1024,7 @@ EMBEDDED_STOD = [
       "komvux",
       "högskola"
     ],
-    "kort_beskrivning": "Bidrag och lån för studier på gymnasial eller eftergymnasial nivå.",
+    "kort_beskrivning": "Bidrag och lån för studier på gymnasial eller eftergymnasial niva.",
     "kort_beskrivning_en": "Grant and loan for studies.",
     "kort_beskrivning_ar": "منحة وقرض للدراسة.",
     "villkor": [
@@ -1169,12 +1207,171 @@ EMBEDDED_STOD = [
 # ── Slut inbakad databas ─────────────────────────────────────────
 
 
+# ── Katalog (inläst databas med omladdning) ──────────────────────
+
+
+class KatalogVersion:
+    """En inläst version av stöddatabasen.
+
+    Allt som härleds ur databasen (index, cachar, förrenderad text) hör till
+    en version och nycklas på ``version``, som är en hash av filinnehållet.
+    """
+
+    def __init__(self, stod: list[dict], version: str):
+        self.stod = stod
+        self.version = version
+        self.normaliserat = [normalisera_stod(s) for s in stod]
+        self.analysator = Analysator(self.normaliserat, SYNONYMER)
+        self.index = Sokindex(self.normaliserat)
+        self.bm25 = BM25Index(self.normaliserat, self.analysator)
+        self.filter = Filterindex(self.normaliserat)
+        self.aktualitet = Aktualitet(stod)
+        self.fragment = Textfragment(stod)
+
+        # ID-uppslag: exakta ID:n först, sedan normaliserade ID:n och alias
+        # (t.ex. ID:n som bytts ut) så länge de inte krockar med ett riktigt ID.
+        self.id_index: dict[str, int] = {}
+        for dok, s in enumerate(stod):
+            for alias in s.get("alias", []):
+                self.id_index.setdefault(normalisera_id(alias), dok)
+        for dok, s in enumerate(stod):
+            self.id_index[normalisera_id(s["id"])] = dok
+        for dok, s in enumerate(stod):
+            self.id_index[s["id"]] = dok
+        self.matris = None
+        if np is not None and len(stod) >= VEKTOR_TROSKEL:
+            self.matris = TermDokumentMatris(self.index, len(stod))
+        self.laddad = time.time()
+
+    def position(self, stod_id: str) -> int | None:
+        """Stödets position i katalogen, skiftlägesokänsligt eller via alias."""
+        dok = self.id_index.get(stod_id)
+        if dok is None:
+            dok = self.id_index.get(normalisera_id(stod_id))
+        return dok
+
+    def hitta(self, stod_id: str) -> dict | None:
+        """Slår upp ett stöd på ID, skiftlägesokänsligt eller via alias."""
+        dok = self.position(stod_id)
+        return None if dok is None else self.stod[dok]
+
+
+class Katalog:
+    """Processgemensam stöddatabas som laddas en gång och laddas om vid ändring.
+
+    Varje anrop till hamta() gör bara en os.stat() på filen. Om mtime eller
+    storlek ändrats läses filen och hashas; har innehållet ändrats byggs en ny
+    KatalogVersion färdigt och byts sedan in i ett svep, så att pågående anrop
+    alltid ser en hel version. Saknas filen används den inbakade databasen.
+
+    En fil som inte går att läsa eller bygga hoppas över tills den ändras
+    igen, och under en ombyggnad får övriga anrop den föregående versionen
+    i stället för att vänta på låset.
+    """
+
+    def __init__(self, fil: Path, reserv: list[dict]):
+        self._fil = fil
+        self._reserv = reserv
+        self._las = threading.Lock()
+        self._stat: tuple | None = None
+        self._aktuell: KatalogVersion | None = None
+        self._trasig: tuple[tuple | None, str] | None = None  # (stat, hash) för en fil som inte gick att ladda
+        self.senaste_fel: str | None = None
+        self.vid_ny_version: list = []  # anropas med varje ny KatalogVersion
+        self.laddningar = 0
+        self.laddningstid = 0.0
+        self.senaste_laddningstid = 0.0
+
+    def _stat_nyckel(self) -> tuple | None:
+        try:
+            st = os.stat(self._fil)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def hamta(self) -> KatalogVersion:
+        """Returnerar aktuell version, och laddar om filen om den ändrats."""
+        stat = self._stat_nyckel()
+        aktuell = self._aktuell
+        if aktuell is not None and (stat == self._stat or (self._trasig is not None and stat == self._trasig[0])):
+            return aktuell
+        if aktuell is None:
+            self._las.acquire()
+        elif not self._las.acquire(blocking=False):
+            # En annan tråd bygger redan den nya versionen
+            return aktuell
+        try:
+            if self._aktuell is None or stat != self._stat:
+                self._ladda(stat)
+            return self._aktuell
+        finally:
+            self._las.release()
+
+    def _ladda(self, stat: tuple | None) -> None:
+        if stat is None:
+            data = json.dumps(self._reserv, ensure_ascii=False).encode("utf-8")
+            version = "inbakad-" + hashlib.sha256(data).hexdigest()[:12]
+            if self._aktuell is None or self._aktuell.version != version:
+                self._bygg(self._reserv, version)
+            self._stat = stat
+            return
+
+        with open(self._fil, "rb") as f:
+            data = f.read()
+        version = hashlib.sha256(data).hexdigest()[:12]
+        if self._aktuell is not None and self._aktuell.version == version:
+            # Bara tidsstämpeln har ändrats (t.ex. touch eller ny checkout)
+            self._stat = stat
+            return
+        if self._trasig is not None and self._trasig[1] == version:
+            self._trasig = (stat, version)
+            return
+        try:
+            self._bygg(json.loads(data), version)
+        except Exception as e:
+            # Halvskriven fil eller stöd som saknar fält — behåll nuvarande
+            # version och försök inte igen förrän filen ändrats.
+            if self._aktuell is None:
+                raise
+            self._trasig = (stat, version)
+            self.senaste_fel = f"{version}: {type(e).__name__}: {e}"
+            return
+        self._stat = stat
+        self._trasig = None
+
+    def _bygg(self, stod: list[dict], version: str) -> None:
+        start = time.perf_counter()
+        self._aktuell = KatalogVersion(stod, version)
+        self.senaste_laddningstid = time.perf_counter() - start
+        self.laddningstid += self.senaste_laddningstid
+        self.laddningar += 1
+        for funktion in self.vid_ny_version:
+            funktion(self._aktuell)
+
+    def statistik(self) -> dict:
+        """Antal laddningar och hur lång tid det tagit att bygga versionerna."""
+        aktuell = self._aktuell
+        return {
+            "version": aktuell.version if aktuell else None,
+            "antal_stod": len(aktuell.stod) if aktuell else 0,
+            "laddningar": self.laddningar,
+            "laddningstid_s": self.laddningstid,
+            "senaste_laddningstid_s": self.senaste_laddningstid,
+            "senaste_fel": self.senaste_fel,
+        }
+
+    @property
+    def version(self) -> str:
+        """Versions-id för aktuell databas."""
+        return self.hamta().version
+
+
+katalog = Katalog(STOD_FILE, EMBEDDED_STOD)
+
+
 def ladda_stod() -> list[dict]:
-    """Laddar alla stöd från JSON-databasen (med inbakad fallback)."""
-    if STOD_FILE.exists():
-        with open(STOD_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return EMBEDDED_STOD
+    """Returnerar alla stöd från den inlästa databasen (med inbakad fallback)."""
+    return katalog.hamta().stod
 
 
 def get_name(stod: dict, lang: str = "sv") -> str:
@@ -1191,16 +1388,64 @@ def get_description(stod: dict, lang: str = "sv") -> str:
     return stod.get(f"kort_beskrivning_{lang}", stod["kort_beskrivning"])
 
 
-def verifierings_flagga(stod: dict) -> str:
-    """Returnerar varningsflagga om info kan vara inaktuell."""
-    verifierad = stod.get("senast_verifierad", "")
+@functools.lru_cache(maxsize=4096)
+def tolka_verifieringsdatum(verifierad: str) -> int | None:
+    """senast_verifierad som datumordinal, eller None om datumet är ogiltigt."""
     try:
-        ver_datum = datetime.strptime(verifierad, "%Y-%m-%d")
-        if datetime.now() - ver_datum > timedelta(days=180):
-            return " ⚠️"
+        return datetime.strptime(verifierad, "%Y-%m-%d").toordinal()
     except ValueError:
-        return " ⚠️"
-    return ""
+        return None
+
+
+def ar_inaktuell(ordinal: int | None, idag: int) -> bool:
+    """Sant om ett verifieringsdatum (ordinal) är för gammalt eller saknas."""
+    return ordinal is None or idag - ordinal >= INAKTUELL_EFTER_DAGAR
+
+
+def verifierings_flagga(stod: dict) -> str:
+    """Returnerar varningsflagga om info kan vara inaktuell."""
+    ordinal = tolka_verifieringsdatum(stod.get("senast_verifierad", ""))
+    return " ⚠️" if ar_inaktuell(ordinal, date.today().toordinal()) else ""
+
+
+class Aktualitet:
+    """Verifieringsdatum tolkade vid inläsning, med inaktualitet per dag.
+
+    ``datum`` är senast_verifierad som ordinal (None om ogiltigt). Stöden
+    hålls också sorterade på datum, så att "verifierade sedan X" är en
+    binärsökning. Mängden inaktuella stöd räknas om bara när datumet byts.
+    """
+
+    def __init__(self, stod: list[dict]):
+        self.antal_stod = len(stod)
+        self.datum = [tolka_verifieringsdatum(s.get("senast_verifierad", "")) for s in stod]
+        giltiga = sorted((d, dok) for dok, d in enumerate(self.datum) if d is not None)
+        self._sorterade_datum = [d for d, _ in giltiga]
+        self._sorterade_dok = [dok for _, dok in giltiga]
+        self._ogiltiga = [dok for dok, d in enumerate(self.datum) if d is None]
+        self._dag: int | None = None
+        self._inaktuella = Urval(0, self.antal_stod)
+
+    def inaktuella(self) -> "Urval":
+        """Stöd som inte verifierats på INAKTUELL_EFTER_DAGAR dagar (eller saknar datum)."""
+        idag = date.today().toordinal()
+        if self._dag != idag:
+            grans = bisect.bisect_right(self._sorterade_datum, idag - INAKTUELL_EFTER_DAGAR)
+            bitar = bytearray((self.antal_stod + 7) // 8)
+            for dok in self._sorterade_dok[:grans] + self._ogiltiga:
+                bitar[dok >> 3] |= 1 << (dok & 7)
+            self._inaktuella = Urval(int.from_bytes(bitar, "little"), self.antal_stod)
+            self._dag = idag
+        return self._inaktuella
+
+    def flagga(self, dok: int) -> str:
+        """Varningsflagga för stöd ``dok`` om informationen kan vara inaktuell."""
+        return " ⚠️" if dok in self.inaktuella() else ""
+
+    def verifierade_sedan(self, datum: date) -> list[int]:
+        """Stöd verifierade ``datum`` eller senare, äldst först."""
+        start = bisect.bisect_left(self._sorterade_datum, datum.toordinal())
+        return self._sorterade_dok[start:]
 
 
 def berakna_relevans(stod: dict, fraga_lower: str, sokord: set) -> int:
@@ -1230,7 +1475,2088 @@ def berakna_relevans(stod: dict, fraga_lower: str, sokord: set) -> int:
     return poang
 
 
-# ── MCP-server ────────────────────────────────────────────────────
+# ── Normalisering ─────────────────────────────────────────────────
+
+
+# Arabiska: diakritiska tecken (harakat) och tatweel tas bort, och varianter
+# av alef, yaa, waw och taa marbuta slås ihop.
+ARABISK_NORMALISERING = str.maketrans(
+    {
+        **{chr(c): None for c in range(0x064B, 0x0660)},
+        "\u0670": None,  # superscript alef
+        "\u0640": None,  # tatweel
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ى": "ي",
+        "ئ": "ي",
+        "ؤ": "و",
+        "ة": "ه",
+    }
+)
+# Vanliga arabiska prefix (bestämd artikel, "och", "med/i", "som") — längst först
+ARABISKA_PREFIX = ("وال", "بال", "كال", "فال", "لل", "ال", "و")
+ARABISKA_TECKEN = re.compile(r"[\u0600-\u06FF]")
+
+
+def normalisera(text: str) -> str:
+    """Normaliserar text för sökning och filtrering.
+
+    Unicode NFKC + casefold, samt arabisk normalisering (påverkar bara
+    arabiska tecken).
+    """
+    return unicodedata.normalize("NFKC", text).casefold().translate(ARABISK_NORMALISERING)
+
+
+# Vikning för inmatning utan svenska eller arabiska specialtecken: latinska
+# diakriter tas bort i vik(), och här viks bokstäver från persiskt/urdu-
+# tangentbord samt arabisk-indiska siffror till sina vanliga motsvarigheter.
+VIKNING = str.maketrans(
+    {
+        "ø": "o",
+        "æ": "ae",
+        "ک": "ك",
+        "ڪ": "ك",
+        "ی": "ي",
+        "ې": "ي",
+        "ۀ": "ه",
+        "ە": "ه",
+        "ھ": "ه",
+        **{chr(0x0660 + i): str(i) for i in range(10)},
+        **{chr(0x06F0 + i): str(i) for i in range(10)},
+    }
+)
+
+
+@functools.lru_cache(maxsize=65536)
+def vik(text: str) -> str:
+    """Normaliserad text utan diakriter: "försäkringskassan" → "forsakringskassan"."""
+    text = text.translate(VIKNING)
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+
+
+def tokenisera(text: str) -> list[str]:
+    """Delar normaliserad text i ord (bokstäver och siffror)."""
+    return re.findall(r"\w+", text)
+
+
+def arabisk_stam(ord: str) -> str:
+    """Tar bort ett vanligt arabiskt prefix (ال، و، بال ...) från ett normaliserat ord.
+
+    Prefixet tas bara bort om minst tre bokstäver återstår; andra ord
+    returneras oförändrade.
+    """
+    if not ARABISKA_TECKEN.search(ord):
+        return ord
+    for prefix in ARABISKA_PREFIX:
+        if ord.startswith(prefix) and len(ord) - len(prefix) >= 3:
+            return ord[len(prefix) :]
+    return ord
+
+
+# Snowball-stemmern för svenska: vokaler, suffix i steg 1 (längst först) och
+# bokstäver som får stå före ett s som tas bort
+SVENSKA_VOKALER = frozenset("aeiouyäåö")
+SVENSKA_SUFFIX = sorted(
+    "a arna erna heterna orna ad e ade ande arne are aste en anden aren heten ern ar er heter "
+    "or as arnas ernas ornas es ades andes ens arens hetens erns at andet het ast".split(),
+    key=len,
+    reverse=True,
+)
+SVENSKT_S_EFTER = frozenset("bcdfghjklmnoprtvy")
+
+
+@functools.lru_cache(maxsize=65536)
+def svensk_stam(ord: str) -> str:
+    """Svensk ordstam enligt Snowball-algoritmen ("hyror" → "hyr", "kostnader" → "kostnad")."""
+    # R1 börjar efter första konsonant som följer en vokal, dock tidigast vid tecken 3
+    r1 = len(ord)
+    for i in range(1, len(ord)):
+        if ord[i] not in SVENSKA_VOKALER and ord[i - 1] in SVENSKA_VOKALER:
+            r1 = i + 1
+            break
+    r1 = max(r1, 3)
+
+    for suffix in SVENSKA_SUFFIX:
+        if ord.endswith(suffix) and len(ord) - len(suffix) >= r1:
+            ord = ord[: -len(suffix)]
+            break
+    else:
+        if ord.endswith("s") and len(ord) - 1 >= r1 and ord[-2] in SVENSKT_S_EFTER:
+            ord = ord[:-1]
+
+    if ord.endswith(("dd", "gd", "nn", "dt", "gt", "kt", "tt")) and len(ord) - 2 >= r1:
+        ord = ord[:-1]
+
+    for suffix, ersattning in (("fullt", "full"), ("löst", "lös"), ("lig", ""), ("els", ""), ("ig", "")):
+        if ord.endswith(suffix) and len(ord) - len(suffix) >= r1:
+            ord = ord[: -len(suffix)] + ersattning
+            break
+    return ord
+
+
+# Längre ord än så här är inga riktiga ord; de stammas och delas inte, så
+# att skräpindata varken kostar kvadratisk tid eller tränger undan riktiga
+# ord ur cacharna.
+ORD_MAX_LANGD = 40
+
+
+def stam(token: str) -> str:
+    """Stammen för ett normaliserat ord: arabiskt prefix eller svenskt suffix borttaget."""
+    if len(token) > ORD_MAX_LANGD:
+        return token
+    return _stam(token)
+
+
+@functools.lru_cache(maxsize=65536)
+def _stam(token: str) -> str:
+    if ARABISKA_TECKEN.search(token):
+        return arabisk_stam(token)
+    return svensk_stam(token)
+
+
+def normalisera_id(stod_id: str) -> str:
+    """Normaliserar ett stöd-ID för uppslag ("FK_Bostadsbidrag " → "fk-bostadsbidrag")."""
+    return re.sub(r"[\s_]+", "-", normalisera(stod_id.strip()))
+
+
+class NormaliseratStod(NamedTuple):
+    """Sök- och filterfälten i ett stöd, normaliserade en gång vid inläsning."""
+
+    signaler: list[str]
+    taggar: list[str]
+    falt: dict[str, str]  # fält i SOKFALT → normaliserad text
+    tokens: dict[str, list[str]]  # signaler, taggar och SOKFALT → ord
+    malgrupp: list[str]
+    kategori: str
+    region: str
+
+
+def normalisera_stod(stod: dict) -> NormaliseratStod:
+    """Bygger den normaliserade sökrepresentationen av ett stöd."""
+    signaler = [normalisera(s) for s in stod.get("relevans_signaler", [])]
+    taggar = [normalisera(t) for t in stod.get("taggar", [])]
+    falt = {f: normalisera(stod.get(f) or "") for f in SOKFALT}
+    tokens = {
+        "relevans_signaler": [t for s in signaler for t in tokenisera(s)],
+        "taggar": [t for s in taggar for t in tokenisera(s)],
+    }
+    tokens.update((f, tokenisera(text)) for f, text in falt.items())
+    return NormaliseratStod(
+        signaler=signaler,
+        taggar=taggar,
+        falt=falt,
+        tokens=tokens,
+        malgrupp=[normalisera(m) for m in stod.get("malgrupp", [])],
+        kategori=normalisera(stod.get("kategori", "")),
+        region=normalisera(stod.get("region", "")),
+    )
+
+
+# ── Frågeanalys ───────────────────────────────────────────────────
+
+# Vikt för träffar på andra former än ordet som det står i frågan
+STAM_FAKTOR = 0.8  # ordstam ("hyror" → "hyr")
+VIKNING_FAKTOR = 0.9  # träff först efter vikning ("forsakringskassan")
+SYNONYM_FAKTOR = 0.9  # svensk motsvarighet från synonymtabellen ("rent" → "hyra")
+RATTNING_FAKTOR = 0.7  # stavningsrättat ord ("bostadbidrag" → "bostadsbidrag")
+DEL_FAKTOR = 0.6  # del av sammansatt ord ("bostadskostnader" → "kostnad")
+
+# Största redigeringsavstånd vid stavningsrättning, efter ordlängd. Kortare
+# ord än fem tecken rättas inte; där är för många ord för nära varandra.
+# Längre ord än RATTNING_MAX_LANGD rättas inte heller: antalet raderingar
+# växer med kvadraten på längden, och så långa ord är inte felstavningar.
+MAX_AVSTAND = 2
+RATTNING_MAX_LANGD = 30
+
+
+def tillatet_avstand(ord: str) -> int:
+    """Hur många fel ett ord får ha och ändå rättas: 0, 1 eller MAX_AVSTAND."""
+    if len(ord) < 5 or len(ord) > RATTNING_MAX_LANGD:
+        return 0
+    return 1 if len(ord) < 9 else MAX_AVSTAND
+
+
+def redigeringsavstand(a: str, b: str) -> int:
+    """Damerau–Levenshtein-avstånd (med omkastade grannbokstäver som ett fel)."""
+    foregaende, rad = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        forra, foregaende, rad = foregaende, rad, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            kostnad = a[i - 1] != b[j - 1]
+            rad[j] = min(foregaende[j] + 1, rad[j - 1] + 1, foregaende[j - 1] + kostnad)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                rad[j] = min(rad[j], forra[j - 2] + 1)
+    return rad[-1]
+
+
+def raderingar(ord: str, antal: int) -> set[str]:
+    """Alla strängar som fås genom att ta bort upp till ``antal`` tecken."""
+    resultat = {ord}
+    niva = {ord}
+    for _ in range(antal):
+        niva = {o[:i] + o[i + 1 :] for o in niva for i in range(len(o))}
+        resultat |= niva
+    return resultat
+
+
+def ladda_synonymer(fil: Path) -> dict[str, list[str]]:
+    """Läser synonymtabellen: ord eller fras → svenska sökord. Tom om filen saknas."""
+    try:
+        with open(fil, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+SYNONYMER = ladda_synonymer(SYNONYM_FILE)
+
+
+def synonymnyckel(text: str) -> str:
+    """Normaliserad text som synonymtabellen slås upp med: ord utan arabiska prefix."""
+    return " ".join(arabisk_stam(t) for t in tokenisera(normalisera(text)))
+
+
+class Stavningsindex:
+    """Stavningsrättning mot katalogens ordförråd med symmetriska raderingar.
+
+    Varje ord lagras vikt (utan diakriter) under alla former med upp till
+    MAX_AVSTAND tecken borttagna. Ett felstavat ord slår upp sina egna
+    raderingar i samma tabell, så kandidaterna hittas utan att ordförrådet
+    gås igenom, och bara de kontrolleras med redigeringsavstand(). Saknade
+    å, ä och ö räknas alltså inte som fel.
+    """
+
+    def __init__(self, ord_och_antal: dict[str, int]):
+        self.antal = ord_och_antal
+        # Vikt ord → det vanligaste katalogordet med den vikningen
+        self.vikta: dict[str, str] = {}
+        for ord, antal in ord_och_antal.items():
+            v = vik(ord)
+            if v not in self.vikta or antal > ord_och_antal[self.vikta[v]]:
+                self.vikta[v] = ord
+        self.raderat: dict[str, list[str]] = {}
+        for v in self.vikta:
+            for r in raderingar(v, MAX_AVSTAND):
+                self.raderat.setdefault(r, []).append(v)
+        self.ratta = functools.lru_cache(maxsize=16384)(self._ratta)
+
+    def _ratta(self, ord: str) -> str | None:
+        """Närmaste ord i ordförrådet inom tillåtet avstånd, vanligast först."""
+        grans = tillatet_avstand(ord)
+        if not grans or ord in self.antal:
+            return None
+        v = vik(ord)
+        kandidater = {k for r in raderingar(v, grans) for k in self.raderat.get(r, ())}
+        basta = None
+        for kandidat in kandidater:
+            avstand = redigeringsavstand(v, kandidat)
+            if avstand <= grans:
+                nyckel = (avstand, -self.antal[self.vikta[kandidat]], kandidat)
+                if basta is None or nyckel < basta:
+                    basta = nyckel
+        return None if basta is None else self.vikta[basta[2]]
+
+
+class Sokord(NamedTuple):
+    """Ett ord i frågan och de former det matchas med, med vikt per form."""
+
+    ord: str
+    former: tuple[tuple[str, float], ...]  # (form, faktor), ordet självt först
+    vikta: tuple[tuple[str, float], ...] = ()  # (vikt form, faktor) att slå upp bland vikta termer
+
+
+class Fragaanalys(NamedTuple):
+    """En analyserad sökfråga, gemensam för alla rankningar."""
+
+    text: str  # normaliserad fråga
+    texter: tuple[tuple[str, str, float], ...]  # (typ, text, faktor) att hitta fraser i:
+    # "exakt" (frågan), "rattad" (med stavningsrättade ord), "stam" (ordstammar),
+    # "vikt" (utan diakriter, mot vikta fraser) eller "synonym" (svenskt sökord)
+    sokord: tuple[Sokord, ...]
+    termer: tuple[tuple[str, float], ...]  # (term, faktor) för BM25
+    rattningar: tuple[tuple[str, str], ...] = ()  # (ord i frågan, rättat ord)
+
+
+class Analysator:
+    """Frågeanalys med ordstammar, orddelning, stavningsrättning och synonymer.
+
+    Ordförrådet är stammarna för alla ord i katalogens sökfält. Ett ord som
+    inte finns där delas, om det går, i kända delar ("bostadskostnader" →
+    "bostad" + "kostnad"), och rättas till närmaste katalogord inom
+    tillatet_avstand() ("ensamstaende" → "ensamstående"). Engelska, arabiska
+    och vardagliga ord och fraser byts till svenska sökord ur
+    synonymtabellen ("single parent" → "ensamstående förälder"), som
+    kompileras till en Frasmatchare när versionen byggs. Analyserade frågor
+    och orddelningar memoreras per katalogversion.
+    """
+
+    def __init__(self, normaliserat: list[NormaliseratStod], synonymer: dict[str, list[str]]):
+        ord_i_katalogen: dict[str, int] = {}
+        for n in normaliserat:
+            for tokens in n.tokens.values():
+                for t in tokens:
+                    ord_i_katalogen[t] = ord_i_katalogen.get(t, 0) + 1
+        self.ordforrad = {stam(t) for t in ord_i_katalogen if len(t) >= 3}
+        # Vikt stam → katalogens stammar, för ord skrivna utan å, ä och ö
+        self.vikta_stammar: dict[str, set[str]] = {}
+        for t in ord_i_katalogen:
+            if len(t) >= 3 and vik(t) != t:
+                self.vikta_stammar.setdefault(stam(vik(t)), set()).add(stam(t))
+        self.synonymer: dict[str, tuple[str, ...]] = {}
+        for fras, svenska in synonymer.items():
+            nyckel = synonymnyckel(fras)
+            if nyckel:
+                mal = self.synonymer.get(nyckel, ()) + tuple(normalisera(s) for s in svenska)
+                self.synonymer[nyckel] = tuple(dict.fromkeys(mal))
+        self.synonym_matchare = Frasmatchare(self.synonymer)
+        # Orden i synonymtabellens nycklar är kända och ska inte stavningsrättas
+        self.synonymord = frozenset(t for nyckel in self.synonymer for t in nyckel.split())
+        self.stavning = Stavningsindex({t: k for t, k in ord_i_katalogen.items() if len(t) >= 4 and t.isalpha()})
+        self.delar = functools.lru_cache(maxsize=16384)(self._delar)
+        self.analysera_fraga = functools.lru_cache(maxsize=4096)(self._analysera_fraga)
+
+    def _kand(self, del_: str) -> str | None:
+        s = stam(del_)
+        return s if len(s) >= 3 and s in self.ordforrad else None
+
+    def _dela(self, ord: str) -> list[str] | None:
+        basta = None
+        for i in range(3, len(ord) - 2):
+            huvud, svans = ord[:i], ord[i:]
+            huvudstam = self._kand(huvud)
+            if huvudstam is None and huvud.endswith("s") and i > 3:
+                huvudstam = self._kand(huvud[:-1])  # fogemorfem: bostad-s-bidrag
+            if huvudstam is None:
+                continue
+            svansstam = self._kand(svans)
+            svansdelar = [svansstam] if svansstam else self._dela(svans)
+            if svansdelar and (basta is None or len(svansdelar) + 1 < len(basta)):
+                basta = [huvudstam] + svansdelar
+        return basta
+
+    def _delar(self, ord: str) -> tuple[str, ...]:
+        """Stammarna för delarna i ett sammansatt ord, eller () om det inte går att dela."""
+        if len(ord) < 6 or len(ord) > ORD_MAX_LANGD or ARABISKA_TECKEN.search(ord):
+            return ()
+        return tuple(self._dela(ord) or ())
+
+    def ar_kant(self, token: str) -> bool:
+        """Sant om ordets stam finns i katalogens ordförråd, med eller utan diakriter."""
+        return stam(token) in self.ordforrad or stam(vik(token)) in self.vikta_stammar
+
+    def synonymer_i(self, text: str) -> list[str]:
+        """Svenska sökord för alla hela ord och fraser i ``text`` som finns i synonymtabellen."""
+        nyckeltext = synonymnyckel(text)
+        svenska = []
+        for slut, fras in self.synonym_matchare.sok(nyckeltext):
+            start = slut - len(fras) + 1
+            if (start == 0 or nyckeltext[start - 1] == " ") and (slut + 1 == len(nyckeltext) or nyckeltext[slut + 1] == " "):
+                svenska.extend(self.synonymer[fras])
+        return list(dict.fromkeys(svenska))
+
+    def rattning(self, token: str) -> str | None:
+        """Rättad stavning för ett okänt ord, eller None.
+
+        Ord ur synonymtabellen räknas som kända ("education" ska översättas,
+        inte rättas till "deduction").
+        """
+        if not token.isalpha() or self.ar_kant(token) or arabisk_stam(token) in self.synonymord:
+            return None
+        return self.stavning.ratta(token)
+
+    def dokumenttermer(self, tokens: list[str]) -> list[str]:
+        """BM25-termer för ord i katalogen: stammar plus delar av sammansatta ord."""
+        termer = []
+        for t in tokens:
+            termer.append(stam(t))
+            termer.extend(self.delar(t))
+        return termer
+
+    def _analysera_fraga(self, text: str, utoka: bool = True) -> Fragaanalys:
+        """Analyserar en normaliserad fråga.
+
+        Med ``utoka=False`` matchas bara orden som de står (med arabiska
+        prefix borttagna), vilket ger exakt samma poäng som berakna_relevans().
+        """
+        sokord = []
+        rattningar = {}  # stavningsfel som visas för användaren
+        rattade = {}  # alla ord som fått en närliggande katalogform: ord → (form, faktor)
+        for ord in dict.fromkeys(text.split()):
+            former = [(arabisk_stam(ord), 1.0)]
+            if utoka:
+                for token in tokenisera(ord):
+                    s = stam(token)
+                    if len(s) >= 3 and all(s != f for f, _ in former):
+                        former.append((s, STAM_FAKTOR))
+                    rattat = self.rattning(token)
+                    if rattat is not None:
+                        # Samma ord utan diakriter ("ensamstaende") eller en annan
+                        # böjning ("foraldrar" → "förälder") är inget stavningsfel.
+                        if vik(rattat) == vik(token):
+                            faktor = VIKNING_FAKTOR
+                        elif vik(token).startswith(vik(stam(rattat))):
+                            faktor = STAM_FAKTOR
+                        else:
+                            faktor = RATTNING_FAKTOR
+                            rattningar[token] = rattat
+                        rattade[token] = (rattat, faktor)
+                        for form in dict.fromkeys((rattat, stam(rattat))):
+                            if all(form != f for f, _ in former):
+                                former.append((form, faktor))
+            # Korta ord viks inte; "for" skulle annars träffa allt som börjar på "för"
+            vikta = tuple((vik(f), faktor * VIKNING_FAKTOR) for f, faktor in former if len(f) >= 4) if utoka else ()
+            sokord.append(Sokord(ord, tuple(former), vikta))
+
+        tokens = tokenisera(text)
+        termer = {stam(t): 1.0 for t in tokens}
+        texter = [("exakt", text, 1.0)]
+        if rattningar:
+            rattad_text = re.sub(r"\w+", lambda m: rattningar.get(m.group(), m.group()), text)
+            texter.append(("rattad", rattad_text, RATTNING_FAKTOR))
+        if utoka:
+            for rattat, faktor in rattade.values():
+                termer.setdefault(stam(rattat), faktor)
+            for t in tokens:
+                for s in self.vikta_stammar.get(stam(vik(t)), ()):
+                    termer.setdefault(s, VIKNING_FAKTOR)
+            kanda = {s.ord for s in sokord}
+            for token in tokens:
+                if token in rattade or self.ar_kant(token):
+                    continue
+                for del_ in self.delar(token):
+                    termer.setdefault(del_, DEL_FAKTOR)
+                    if del_ not in kanda:
+                        kanda.add(del_)
+                        sokord.append(Sokord(del_, ((del_, DEL_FAKTOR),)))
+            for svensk in self.synonymer_i(text):
+                texter.append(("synonym", svensk, SYNONYM_FAKTOR))
+                for t in tokenisera(svensk):
+                    termer.setdefault(stam(t), SYNONYM_FAKTOR)
+                    if t not in kanda:
+                        kanda.add(t)
+                        sokord.append(Sokord(t, ((t, SYNONYM_FAKTOR),)))
+            texter.append(("stam", " ".join(stam(t) for t in tokens), STAM_FAKTOR))
+            texter.append(("vikt", vik(text), VIKNING_FAKTOR))
+
+        return Fragaanalys(text, tuple(texter), tuple(sokord), tuple(termer.items()), tuple(rattningar.items()))
+
+
+# ── Filterindex ───────────────────────────────────────────────────
+
+
+class Urval:
+    """En mängd stöd (positioner i katalogen) som bitmängd.
+
+    Bit i i ``bitar`` är satt om stöd i ingår. Medlemskap slås upp i en
+    byte-kopia så att det är konstant tid även för stora kataloger.
+    """
+
+    def __init__(self, bitar: int, antal_stod: int):
+        self.bitar = bitar
+        self.antal_stod = antal_stod
+        self._bytes = bitar.to_bytes((antal_stod + 7) // 8, "little")
+
+    def __contains__(self, dok: int) -> bool:
+        return bool(self._bytes[dok >> 3] >> (dok & 7) & 1)
+
+    def __len__(self) -> int:
+        return self.bitar.bit_count()
+
+    def __iter__(self):
+        """Stöden i katalogordning."""
+        for i, byte in enumerate(self._bytes):
+            if byte:
+                for j in range(8):
+                    if byte >> j & 1:
+                        yield 8 * i + j
+
+    def mask(self):
+        """Urvalet som boolesk NumPy-vektor (kräver NumPy)."""
+        bitar = np.unpackbits(np.frombuffer(self._bytes, dtype=np.uint8), bitorder="little")
+        return bitar[: self.antal_stod].astype(bool)
+
+
+class Filterindex:
+    """Bitmängder per värde på malgrupp, kategori och region.
+
+    Filterkombinationer löses med AND/OR på heltal innan någon poäng räknas.
+    Region filtreras som delsträng (t.ex. "västernorrland"), så de få
+    distinkta regionvärden som matchar slås ihop med OR.
+    """
+
+    def __init__(self, normaliserat: list[NormaliseratStod]):
+        self.antal_stod = len(normaliserat)
+        self.malgrupp: dict[str, int] = {}
+        self.kategori: dict[str, int] = {}
+        self.region: dict[str, int] = {}
+        for dok, n in enumerate(normaliserat):
+            bit = 1 << dok
+            for mg in n.malgrupp:
+                self.malgrupp[mg] = self.malgrupp.get(mg, 0) | bit
+            self.kategori[n.kategori] = self.kategori.get(n.kategori, 0) | bit
+            self.region[n.region] = self.region.get(n.region, 0) | bit
+
+    def urval(self, malgrupp: str = "", kategori: str = "", region: str = "") -> "Urval | None":
+        """Stöden som matchar alla angivna (normaliserade) filter.
+
+        Returnerar None om inget filter är angivet, dvs. hela katalogen.
+        """
+        if not (malgrupp or kategori or region):
+            return None
+        bitar = (1 << self.antal_stod) - 1
+        if malgrupp:
+            bitar &= self.malgrupp.get(malgrupp, 0)
+        if kategori:
+            bitar &= self.kategori.get(kategori, 0)
+        if region:
+            regionbitar = 0
+            for varde, b in self.region.items():
+                if region in varde:
+                    regionbitar |= b
+            bitar &= regionbitar
+        return Urval(bitar, self.antal_stod)
+
+
+# ── Sökindex ──────────────────────────────────────────────────────
+
+SIGNAL_POANG = 3  # relevans_signal finns i frågan
+TAGG_POANG = 2  # tagg finns i frågan
+SOKFALT = ["namn", "namn_en", "namn_ar", "kort_beskrivning", "kort_beskrivning_en", "kort_beskrivning_ar"]
+ARABISKA_FALT = ["namn_ar", "kort_beskrivning_ar"]  # matchas bara av arabiska sökord
+LATINSKA_FALT = [f for f in SOKFALT if f not in ARABISKA_FALT]
+
+
+class Posting(NamedTuple):
+    """En förekomst av en term i ett stöd."""
+
+    dok: int  # position i KatalogVersion.stod
+    falt: str  # "relevans_signaler", "taggar" eller ett fält i SOKFALT
+    vikt: int  # poäng när hela termen finns i frågan (0 för namn/beskrivning)
+
+
+class Frasmatchare:
+    """Aho-Corasick-automat som hittar alla fraser i en text i ett svep.
+
+    Tillstånden är en trie över fraserna med fail-länkar; ``_ut[s]`` är alla
+    fraser som slutar i tillstånd s, inklusive de som nås via fail-länkar.
+    """
+
+    def __init__(self, fraser):
+        goto: list[dict[str, int]] = [{}]
+        ut: list[list[str]] = [[]]
+        for fras in fraser:
+            s = 0
+            for tecken in fras:
+                nasta = goto[s].get(tecken)
+                if nasta is None:
+                    nasta = len(goto)
+                    goto[s][tecken] = nasta
+                    goto.append({})
+                    ut.append([])
+                s = nasta
+            ut[s].append(fras)
+
+        fail = [0] * len(goto)
+        ko = deque(goto[0].values())
+        while ko:
+            r = ko.popleft()
+            for tecken, s in goto[r].items():
+                ko.append(s)
+                f = fail[r]
+                while f and tecken not in goto[f]:
+                    f = fail[f]
+                fail[s] = goto[f].get(tecken, 0) if r else 0
+                if ut[fail[s]]:
+                    ut[s] = ut[s] + ut[fail[s]]
+
+        self._goto = goto
+        self._fail = fail
+        self._ut = ut
+
+    def sok(self, text: str) -> list[tuple[int, str]]:
+        """Returnerar (slutposition, fras) för varje förekomst i ``text``."""
+        goto, fail, ut = self._goto, self._fail, self._ut
+        traffar = []
+        s = 0
+        for i, tecken in enumerate(text):
+            while s and tecken not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(tecken, 0)
+            if ut[s]:
+                traffar.extend((i, fras) for fras in ut[s])
+        return traffar
+
+
+class Sokindex:
+    """Inverterat index över relevans_signaler, taggar, namn och beskrivningar.
+
+    Ger samma poäng som berakna_relevans(), men rör bara de stöd som delar
+    minst en term med frågan i stället för att gå igenom hela katalogen.
+
+    - ``termer``: normaliserad term → postings med fält och vikt.
+    - ``fraser``: de signaler och taggar som ger poäng när de finns i frågan,
+      sammanställda i en Frasmatchare så att en läsning av frågan hittar alla.
+      ``stam_fraser`` är samma fraser som ordstammar, för frågans stammade text.
+    - ``trigram``: tre tecken → term-id, så att termer som innehåller ett
+      sökord hittas utan att hela vokabulären gås igenom.
+    - ``vikta`` och ``vikta_fraser``: termer och fraser utan diakriter →
+      termerna som de står i katalogen, med ett eget trigramindex, så att
+      "forsakringskassan" hittar samma rader som "försäkringskassan".
+    - ``rader``: (term, fält) → stöd, en rad per förekomst. Det är raderna i
+      term–dokument-matrisen som fragevikter() viktar.
+    """
+
+    def __init__(self, normaliserat: list[NormaliseratStod]):
+        termer: dict[str, list[Posting]] = {}
+        for dok, n in enumerate(normaliserat):
+            for signal in n.signaler:
+                termer.setdefault(signal, []).append(Posting(dok, "relevans_signaler", SIGNAL_POANG))
+            for tagg in n.taggar:
+                termer.setdefault(tagg, []).append(Posting(dok, "taggar", TAGG_POANG))
+            for falt, text in n.falt.items():
+                termer.setdefault(text, []).append(Posting(dok, falt, 0))
+        termer.pop("", None)
+
+        self.termer = termer
+        rader: dict[tuple[str, str], list[int]] = {}
+        for term, postings in termer.items():
+            for p in postings:
+                rader.setdefault((term, p.falt), []).append(p.dok)
+        self.rader = rader
+        self.fraser = {t: [p for p in ps if p.vikt] for t, ps in termer.items() if any(p.vikt for p in ps)}
+        self.matchare = Frasmatchare(self.fraser)
+        stam_fraser: dict[str, list[str]] = {}
+        for fras in self.fraser:
+            stammad = " ".join(stam(t) for t in tokenisera(fras))
+            if len(stammad) >= 3:
+                stam_fraser.setdefault(stammad, []).append(fras)
+        self.stam_fraser = stam_fraser
+        self.stam_matchare = Frasmatchare(stam_fraser)
+        self._term_lista = list(termer)
+        self.trigram = self._trigram(self._term_lista)
+
+        # Det vikta indexet har bara termer och fraser som ändras av vik()
+        vikta: dict[str, list[str]] = {}
+        for term in termer:
+            if vik(term) != term:
+                vikta.setdefault(vik(term), []).append(term)
+        self.vikta = vikta
+        self._vikt_lista = list(vikta)
+        self.vikt_trigram = self._trigram(self._vikt_lista)
+        self.vikta_fraser = {v: ts for v, ts in vikta.items() if any(t in self.fraser for t in ts)}
+        self.vikt_matchare = Frasmatchare(self.vikta_fraser)
+
+    @staticmethod
+    def _trigram(termlista: list[str]) -> dict[str, set[int]]:
+        trigram: dict[str, set[int]] = {}
+        for tid, term in enumerate(termlista):
+            for i in range(len(term) - 2):
+                trigram.setdefault(term[i : i + 3], set()).add(tid)
+        return trigram
+
+    def fraser_i(self, text: str) -> set[str]:
+        """Signaler och taggar som ingår som delsträng i ``text``."""
+        return {fras for _, fras in self.matchare.sok(text)}
+
+    def termer_med(self, ord: str, vikta: bool = False) -> list[str]:
+        """Termer där ``ord`` (minst tre tecken) ingår som delsträng.
+
+        Med ``vikta`` söks ``ord`` bland termerna utan diakriter, och
+        termerna returneras som de står i katalogen.
+        """
+        trigram, termlista = (self.vikt_trigram, self._vikt_lista) if vikta else (self.trigram, self._term_lista)
+        mangder = [trigram.get(ord[i : i + 3]) for i in range(len(ord) - 2)]
+        if not mangder or not all(mangder):
+            return []
+        mangder.sort(key=len)
+        kandidater = mangder[0].intersection(*mangder[1:])
+        traffar = [termlista[t] for t in kandidater if ord in termlista[t]]
+        if vikta:
+            return [term for v in traffar for term in self.vikta[v]]
+        return traffar
+
+    def vikta_fraser_i(self, text: str) -> set[str]:
+        """Signaler och taggar som utan diakriter ingår i den vikta ``text``."""
+        return {fras for _, v in self.vikt_matchare.sok(text) for fras in self.vikta_fraser[v] if fras in self.fraser}
+
+    def fragevikter(
+        self, analys: Fragaanalys, delar: dict | None = None
+    ) -> dict[tuple[str, str], float]:
+        """Frågevektorn: vikt per rad (term, fält) i term–dokument-matrisen.
+
+        Poängen för ett stöd är summan av vikt × antal förekomster över
+        raderna i ``rader``. För en fråga analyserad med ``utoka=False`` blir
+        det samma poäng som berakna_relevans(); stammar och orddelar ger
+        samma sorts träffar men med sin lägre faktor, och aldrig mer än
+        ordet självt hade gett.
+
+        Med ``delar`` fylls den med rad → [(sökord, vikt)], vad varje rads
+        vikt består av; sökord är None när hela termen finns i frågan.
+        """
+        vikter: dict[tuple[str, str], float] = {}
+        fraga_lower = analys.text
+
+        # En läsning av frågan ger alla signaler och taggar i den. En träff
+        # som ligger helt inom ett ord är också en signal som ingår i ordet.
+        ordlista = []
+        ord_vid = [-1] * len(fraga_lower)
+        for m in re.finditer(r"\S+", fraga_lower):
+            ord_vid[m.start() : m.end()] = [len(ordlista)] * (m.end() - m.start())
+            ordlista.append(m.group())
+        i_fragan: dict[str, float] = {}
+        i_ord: dict[str, set[str]] = {}
+        for typ, text, faktor in analys.texter:
+            if typ == "exakt":
+                for slut, fras in self.matchare.sok(text):
+                    i_fragan[fras] = max(i_fragan.get(fras, 0.0), faktor)
+                    n = ord_vid[slut - len(fras) + 1]
+                    if n >= 0 and n == ord_vid[slut]:
+                        i_ord.setdefault(ordlista[n], set()).add(fras)
+            elif typ == "stam":
+                for _, stammad in self.stam_matchare.sok(text):
+                    for fras in self.stam_fraser[stammad]:
+                        i_fragan[fras] = max(i_fragan.get(fras, 0.0), faktor)
+            else:
+                traffar = self.vikta_fraser_i(text) if typ == "vikt" else self.fraser_i(text)
+                for fras in traffar:
+                    i_fragan[fras] = max(i_fragan.get(fras, 0.0), faktor)
+
+        # Hela signaler och taggar som finns i frågan (+3 / +2)
+        for term, faktor in i_fragan.items():
+            for falt, vikt in (("relevans_signaler", SIGNAL_POANG), ("taggar", TAGG_POANG)):
+                if (term, falt) in self.rader:
+                    vikter[(term, falt)] = vikt * faktor
+                    if delar is not None:
+                        delar[(term, falt)] = [(None, vikt * faktor)]
+
+        # Sökord som överlappar en signal (+1 per par), eller som finns i
+        # namn/beskrivning (+1 per fält oavsett antal ord). Arabiska ord
+        # söks utan prefix i de arabiska fälten, så att "والمساعدة" hittar
+        # "المساعدة"; övriga ord i de svenska och engelska fälten. Varje
+        # sökord räknas en gång per rad, med den bästa av sina former.
+        falt_vikter: dict[tuple[str, str], float] = {}
+        falt_ord: dict[tuple[str, str], str] = {}
+        for sokord in analys.sokord:
+            signal_vikter: dict[str, float] = {}
+            former = [(form, faktor, False) for form, faktor in sokord.former]
+            former += [(form, faktor, True) for form, faktor in sokord.vikta]
+            for form, faktor, vikt in former:
+                if len(form) <= 2:
+                    continue
+                faltlista = ARABISKA_FALT if ARABISKA_TECKEN.search(form) else LATINSKA_FALT
+                innehaller = self.termer_med(form, vikta=vikt)
+                if vikt:
+                    i_formen = self.vikta_fraser_i(form)
+                else:
+                    i_formen = i_ord.get(sokord.ord, set()) if faktor == 1.0 else self.fraser_i(form)
+                for term in i_formen.union(innehaller):
+                    if (term, "relevans_signaler") in self.rader:
+                        signal_vikter[term] = max(signal_vikter.get(term, 0.0), faktor)
+                for term in innehaller:
+                    for falt in faltlista:
+                        rad = (term, falt)
+                        if rad in self.rader and faktor > falt_vikter.get(rad, 0.0):
+                            falt_vikter[rad] = faktor
+                            falt_ord[rad] = sokord.ord
+            for term, faktor in signal_vikter.items():
+                rad = (term, "relevans_signaler")
+                vikter[rad] = vikter.get(rad, 0) + faktor
+                if delar is not None:
+                    delar.setdefault(rad, []).append((sokord.ord, faktor))
+        vikter.update(falt_vikter)
+        if delar is not None:
+            for rad, faktor in falt_vikter.items():
+                delar[rad] = [(falt_ord[rad], faktor)]
+
+        return vikter
+
+    def poang(self, analys: Fragaanalys, urval: Urval | None = None) -> dict[int, float]:
+        """Relevanspoäng per stöd (position i katalogen) för en analyserad fråga.
+
+        Bara stöd i ``urval`` (om angivet) räknas. Stöd utan poäng saknas i
+        resultatet.
+        """
+        poang: dict[int, float] = {}
+        for rad, vikt in self.fragevikter(analys).items():
+            for dok in self.rader[rad]:
+                if urval is None or dok in urval:
+                    poang[dok] = poang.get(dok, 0) + vikt
+        return poang
+
+    def forklara(self, analys: Fragaanalys, doks) -> dict[int, list[tuple[str, str, str | None, float]]]:
+        """Poängen för stöden i ``doks`` uppdelad på (fält, term, sökord, poäng).
+
+        Delarna summerar till poang(); sökord är None när hela termen finns
+        i frågan (+3 för signaler, +2 för taggar).
+        """
+        delar: dict = {}
+        vikter = self.fragevikter(analys, delar)
+        doks = set(doks)
+        antal: dict[tuple[int, tuple[str, str]], int] = {}
+        for rad in vikter:
+            for dok in self.rader[rad]:
+                if dok in doks:
+                    antal[(dok, rad)] = antal.get((dok, rad), 0) + 1
+        forklaring: dict[int, list] = {dok: [] for dok in doks}
+        for (dok, (term, falt)), n in antal.items():
+            for sokord, vikt in delar[(term, falt)]:
+                forklaring[dok].append((falt, term, sokord, vikt * n))
+        for rader in forklaring.values():
+            rader.sort(key=lambda r: -r[3])
+        return forklaring
+
+
+class TermDokumentMatris:
+    """Glesa (CSR) term–dokument-matrisen för Sokindex, för stora kataloger.
+
+    Raderna är Sokindex.rader och värdet är antal förekomster i stödet.
+    Poängen för alla stöd fås med en enda matris–vektor-produkt mot
+    frågevektorn från Sokindex.fragevikter(), i NumPy i stället för Python.
+    """
+
+    def __init__(self, index: Sokindex, antal_stod: int):
+        self.antal_stod = antal_stod
+        self.rad_id = {rad: i for i, rad in enumerate(index.rader)}
+        langder = [len(doks) for doks in index.rader.values()]
+        self.indptr = np.zeros(len(langder) + 1, dtype=np.int64)
+        np.cumsum(langder, out=self.indptr[1:])
+        self.indices = np.fromiter(
+            (dok for doks in index.rader.values() for dok in doks), dtype=np.int32, count=int(self.indptr[-1])
+        )
+
+    def poang(self, vikter: dict[tuple[str, str], float], urval: Urval | None = None) -> dict[int, float]:
+        """Poäng per stöd för en frågevektor, maskat med ``urval``.
+
+        Stöd utan poäng utelämnas.
+        """
+        if not vikter:
+            return {}
+        rader = np.fromiter((self.rad_id[r] for r in vikter), dtype=np.int64, count=len(vikter))
+        v = np.fromiter(vikter.values(), dtype=np.float64, count=len(vikter))
+        starter = self.indptr[rader]
+        langder = self.indptr[rader + 1] - starter
+        # Positioner i indices för alla postings på frågans rader
+        forskjutning = np.repeat(starter - (np.cumsum(langder) - langder), langder)
+        pos = np.arange(int(langder.sum())) + forskjutning
+        poang = np.bincount(self.indices[pos], weights=np.repeat(v, langder), minlength=self.antal_stod)
+        if urval is not None:
+            poang *= urval.mask()
+        traffar = np.flatnonzero(poang)
+        return dict(zip(traffar.tolist(), poang[traffar].tolist()))
+
+
+# ── Rankning ──────────────────────────────────────────────────────
+
+# BM25F: fältvikter och längdnormalisering per fält
+BM25_K1 = 1.2
+BM25_FALT = {
+    # fält: (vikt, b)
+    "relevans_signaler": (3.0, 0.5),
+    "taggar": (2.0, 0.3),
+    "namn": (1.5, 0.5),
+    "namn_en": (1.5, 0.5),
+    "namn_ar": (1.5, 0.5),
+    "kort_beskrivning": (1.0, 0.75),
+    "kort_beskrivning_en": (1.0, 0.75),
+    "kort_beskrivning_ar": (1.0, 0.75),
+}
+
+
+class BM25Index:
+    """Fältviktat BM25 (BM25F) över de normaliserade sökfälten.
+
+    Termerna är ordstammar, och sammansatta ord räknas även som sina delar.
+    Allt som inte beror på frågan räknas ut vid inläsning: dokumentlängder,
+    medellängd per fält, IDF och till sist varje terms färdiga poängbidrag
+    per stöd. En sökning summerar bara bidragen för frågans termer.
+    """
+
+    def __init__(self, normaliserat: list[NormaliseratStod], analysator: Analysator):
+        antal = len(normaliserat)
+        self._normaliserat = normaliserat
+        self._analysator = analysator
+        termer = [{falt: analysator.dokumenttermer(n.tokens[falt]) for falt in BM25_FALT} for n in normaliserat]
+        self.medel = medel = {
+            falt: sum(len(t[falt]) for t in termer) / antal if antal else 0.0
+            for falt in BM25_FALT
+        }
+
+        # Viktad, längdnormaliserad termfrekvens per term och stöd
+        tf: dict[str, dict[int, float]] = {}
+        for dok, t in enumerate(termer):
+            for falt, (vikt, b) in BM25_FALT.items():
+                tokens = t[falt]
+                if not tokens:
+                    continue
+                norm = 1 - b + b * len(tokens) / medel[falt]
+                for token in tokens:
+                    per_dok = tf.setdefault(token, {})
+                    per_dok[dok] = per_dok.get(dok, 0.0) + vikt / norm
+
+        self.idf = {
+            term: math.log(1 + (antal - len(per_dok) + 0.5) / (len(per_dok) + 0.5))
+            for term, per_dok in tf.items()
+        }
+        self.bidrag = {
+            term: {dok: self.idf[term] * t * (BM25_K1 + 1) / (BM25_K1 + t) for dok, t in per_dok.items()}
+            for term, per_dok in tf.items()
+        }
+
+    def poang(self, termer, urval: Urval | None = None) -> dict[int, float]:
+        """BM25F-poäng per stöd (i ``urval``) för frågans (term, faktor)."""
+        poang: dict[int, float] = {}
+        for term, faktor in termer:
+            for dok, bidrag in self.bidrag.get(term, {}).items():
+                if urval is None or dok in urval:
+                    poang[dok] = poang.get(dok, 0.0) + bidrag * faktor
+        return poang
+
+    def forklara(self, termer, doks) -> dict[int, list[tuple[str, str, str | None, float]]]:
+        """Poängen för stöden i ``doks`` uppdelad på (fält, term, None, poäng).
+
+        BM25F mättar termfrekvensen över alla fält tillsammans, så varje
+        terms bidrag fördelas på fälten efter deras andel av den viktade
+        termfrekvensen. Fälten räknas om här, bara för de förklarade stöden.
+        """
+        forklaring: dict[int, list] = {}
+        for dok in doks:
+            tf_falt: dict[str, dict[str, float]] = {}
+            for falt, (vikt, b) in BM25_FALT.items():
+                tokens = self._analysator.dokumenttermer(self._normaliserat[dok].tokens[falt])
+                if tokens:
+                    norm = 1 - b + b * len(tokens) / self.medel[falt]
+                    for token in tokens:
+                        per_falt = tf_falt.setdefault(token, {})
+                        per_falt[falt] = per_falt.get(falt, 0.0) + vikt / norm
+            rader = []
+            for term, faktor in termer:
+                bidrag = self.bidrag.get(term, {}).get(dok)
+                if bidrag is None:
+                    continue
+                per_falt = tf_falt[term]
+                summa = sum(per_falt.values())
+                for falt, tf in per_falt.items():
+                    rader.append((falt, term, None, bidrag * faktor * tf / summa))
+            rader.sort(key=lambda r: -r[3])
+            forklaring[dok] = rader
+        return forklaring
+
+
+def rankning_klassisk(version: "KatalogVersion", fraga: str, urval: Urval | None = None) -> dict[int, float]:
+    """3/2/1-poäng enligt berakna_relevans(), via det inverterade indexet.
+
+    Ord som inte träffar som de står matchas också på ordstam och, för
+    sammansatta ord, på delarna, med lägre vikt. Stora kataloger räknas i
+    ett svep över term–dokument-matrisen.
+    """
+    analys = version.analysator.analysera_fraga(fraga)
+    if version.matris is not None:
+        return version.matris.poang(version.index.fragevikter(analys), urval)
+    return version.index.poang(analys, urval)
+
+
+def rankning_bm25(version: "KatalogVersion", fraga: str, urval: Urval | None = None) -> dict[int, float]:
+    """BM25F-poäng med IDF och mättad termfrekvens."""
+    return version.bm25.poang(version.analysator.analysera_fraga(fraga).termer, urval)
+
+
+# Valbara rankningar: namn → funktion(version, normaliserad fråga, urval) som
+# returnerar poäng per stöd (position i katalogen) inom urvalet (None = alla).
+# Stöd utan poäng utelämnas.
+RANKNINGAR = {
+    "klassisk": rankning_klassisk,
+    "bm25": rankning_bm25,
+}
+
+
+def forklaring_klassisk(version: "KatalogVersion", fraga: str, doks) -> dict:
+    return version.index.forklara(version.analysator.analysera_fraga(fraga), doks)
+
+
+def forklaring_bm25(version: "KatalogVersion", fraga: str, doks) -> dict:
+    return version.bm25.forklara(version.analysator.analysera_fraga(fraga).termer, doks)
+
+
+# Förklaring per rankning: namn → funktion(version, normaliserad fråga, stöd)
+# som returnerar stöd → [(fält, term, sökord, poäng)], delar som summerar
+# till stödets poäng i RANKNINGAR.
+FORKLARINGAR = {
+    "klassisk": forklaring_klassisk,
+    "bm25": forklaring_bm25,
+}
+
+
+# ── Sökning och resultatcache ─────────────────────────────────────
+
+
+class Rangordning:
+    """Poängsatta stöd för en sökning, sorterade först när de efterfrågas.
+
+    topp(k) väljer de k bästa med en heap i stället för att sortera alla
+    träffar, och sparar dem så att nästa sida bara utökar urvalet utan att
+    något poängsätts om. Högst poäng först; lika poäng i katalogordning.
+    ``nyckel`` är den normaliserade sökningen och ``version`` katalog-
+    versionen; cursorer knyts till båda.
+    """
+
+    def __init__(self, nyckel: tuple, poang: dict[int, float], version: str = ""):
+        self.nyckel = nyckel
+        self.poang = poang
+        self.version = version
+        self._sorterade: list[tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.poang)
+
+    def topp(self, antal: int) -> list[tuple[float, int]]:
+        """(poäng, position i katalogen) för de ``antal`` bästa stöden."""
+        sorterade = self._sorterade
+        if len(sorterade) < min(antal, len(self.poang)):
+            if antal * 4 >= len(self.poang):
+                # Nästan alla efterfrågas — en hel sortering är billigare
+                sorterade = sorted(((p, dok) for dok, p in self.poang.items()), key=lambda x: (-x[0], x[1]))
+            else:
+                basta = heapq.nsmallest(antal, ((-p, dok) for dok, p in self.poang.items()))
+                sorterade = [(-p, dok) for p, dok in basta]
+            self._sorterade = sorterade
+        return sorterade[:antal]
+
+    def sida(self, start: int, antal: int) -> list[tuple[float, int]]:
+        """Träffarna på plats ``start`` till ``start + antal``."""
+        return self.topp(start + antal)[start:]
+
+    def fingeravtryck(self) -> str:
+        return hashlib.sha256(repr((self.version, self.nyckel)).encode("utf-8")).hexdigest()[:16]
+
+
+def skapa_cursor(rangordning: Rangordning, start: int) -> str:
+    """Opak cursor till sidan som börjar på plats ``start``."""
+    data = json.dumps([start, rangordning.fingeravtryck()]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def las_cursor(cursor: str, rangordning: Rangordning) -> int | None:
+    """Startplatsen i ``cursor``, eller None om den är ogiltig eller hör till en annan sökning eller katalogversion."""
+    try:
+        start, fingeravtryck = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(start, int) or start < 0 or fingeravtryck != rangordning.fingeravtryck():
+        return None
+    return start
+
+
+def rangordna(
+    version: KatalogVersion,
+    fraga_norm: str,
+    malgrupp: str = "",
+    kategori: str = "",
+    region: str = "",
+    rankning: str = "klassisk",
+    tider: dict | None = None,
+) -> Rangordning:
+    """Poängsätter stöden för en normaliserad fråga och normaliserade filter.
+
+    Alla stöd med poäng ingår; se Rangordning för hur de sorteras. Med
+    ``tider`` sparas sekunderna för stegen "filter" och "poang" i den.
+    """
+    nyckel = (fraga_norm, malgrupp, kategori, region, rankning)
+    # Filtren löses i filterindexet innan något poängsätts.
+    start = time.perf_counter()
+    urval = version.filter.urval(malgrupp, kategori, region)
+    filtrerat = time.perf_counter()
+    if urval is not None and not urval.bitar:
+        poang = {}
+    else:
+        poang = RANKNINGAR[rankning](version, fraga_norm, urval)
+    if tider is not None:
+        tider["filter"] = filtrerat - start
+        tider["poang"] = time.perf_counter() - filtrerat
+    return Rangordning(nyckel, poang, version.version)
+
+
+class Resultatcache:
+    """Begränsad LRU-cache med TTL för rangordnade sökresultat.
+
+    Cachen begränsas både av antalet poster och, med ``max_traffar``, av
+    summan av posternas len() — för en Rangordning antalet poängsatta
+    stöd, som är det som tar minne i en stor katalog. Posterna hör till en
+    katalogversion; när en annan version efterfrågas töms cachen.
+    Räknarna kan läsas med statistik().
+    """
+
+    def __init__(self, max_antal: int, ttl: float, max_traffar: int | None = None):
+        self.max_antal = max_antal
+        self.max_traffar = max_traffar
+        self.ttl = ttl
+        self._poster: OrderedDict = OrderedDict()
+        self._traffar_i_cachen = 0
+        self._version: str | None = None
+        self._las = threading.Lock()
+        self.traffar = 0
+        self.missar = 0
+        self.utkastade = 0
+        self.utgangna = 0
+        self.invalideringar = 0
+
+    def _byt_version(self, version: str) -> None:
+        if version != self._version:
+            if self._poster:
+                self.invalideringar += 1
+            self._poster.clear()
+            self._traffar_i_cachen = 0
+            self._version = version
+
+    def _ta_bort(self, nyckel) -> None:
+        _, varde = self._poster.pop(nyckel)
+        self._traffar_i_cachen -= len(varde)
+
+    def hamta(self, version: str, nyckel):
+        """Returnerar cachat värde, eller None vid miss."""
+        with self._las:
+            self._byt_version(version)
+            post = self._poster.get(nyckel)
+            if post is None:
+                self.missar += 1
+                return None
+            tid, varde = post
+            if time.monotonic() - tid > self.ttl:
+                self._ta_bort(nyckel)
+                self.utgangna += 1
+                self.missar += 1
+                return None
+            self._poster.move_to_end(nyckel)
+            self.traffar += 1
+            return varde
+
+    def spara(self, version: str, nyckel, varde) -> None:
+        """Sparar ett värde och kastar ut de äldst använda vid behov."""
+        if self.max_antal <= 0 or (self.max_traffar is not None and len(varde) > self.max_traffar):
+            return
+        with self._las:
+            self._byt_version(version)
+            if nyckel in self._poster:
+                self._ta_bort(nyckel)
+            self._poster[nyckel] = (time.monotonic(), varde)
+            self._traffar_i_cachen += len(varde)
+            while len(self._poster) > self.max_antal or (
+                self.max_traffar is not None and self._traffar_i_cachen > self.max_traffar
+            ):
+                self._ta_bort(next(iter(self._poster)))
+                self.utkastade += 1
+
+    def statistik(self) -> dict:
+        """Träffar, missar, utkastade och utgångna poster samt storlek."""
+        with self._las:
+            return {
+                "traffar": self.traffar,
+                "missar": self.missar,
+                "utkastade": self.utkastade,
+                "utgangna": self.utgangna,
+                "invalideringar": self.invalideringar,
+                "storlek": len(self._poster),
+                "max_antal": self.max_antal,
+                "traffar_i_cachen": self._traffar_i_cachen,
+                "max_traffar": self.max_traffar,
+            }
+
+
+sok_cache = Resultatcache(CACHE_STORLEK, CACHE_TTL, CACHE_MAX_TRAFFAR)
+
+
+def sok(
+    version: KatalogVersion,
+    fraga: str,
+    malgrupp: str = "",
+    kategori: str = "",
+    region: str = "",
+    rankning: str = "klassisk",
+    tider: dict | None = None,
+) -> tuple[str, Rangordning]:
+    """Normaliserar fråga och filter och rangordnar via resultatcachen.
+
+    Returnerar den normaliserade frågan och rangordningen från rangordna().
+    Med ``tider`` räknas sökningen om även om den finns i cachen, så att
+    rangordna() kan mäta stegen.
+    """
+    fraga_norm = " ".join(normalisera(fraga).split())
+
+    # Mappa engelska termer till filter
+    malgrupp_map = {"individual": "privatperson", "business": "företag", "person": "privatperson"}
+    malgrupp = normalisera(malgrupp)
+    malgrupp = malgrupp_map.get(malgrupp, malgrupp)
+    kategori = normalisera(kategori)
+    region = normalisera(region)
+
+    nyckel = (fraga_norm, malgrupp, kategori, region, rankning)
+    resultat = None if tider is not None else sok_cache.hamta(version.version, nyckel)
+    if resultat is None:
+        resultat = rangordna(version, fraga_norm, malgrupp, kategori, region, rankning, tider)
+        sok_cache.spara(version.version, nyckel, resultat)
+    return fraga_norm, resultat
+
+
+# Max antal sökningar per anrop till sok_stod_batch och träffar per sökning
+BATCH_MAX = 1000
+BATCH_TRAFFAR = 8
+# Fält i en batchsökning; alla är text, och null räknas som att fältet saknas
+BATCH_FALT = ("fraga", "malgrupp", "kategori", "region", "sprak", "rankning")
+
+
+def sok_batch(
+    sokningar: list[dict],
+    sprak: str = "sv",
+    rankning: str = "",
+    version: KatalogVersion | None = None,
+) -> list[dict]:
+    """Kör många sökningar mot samma katalogversion.
+
+    Varje sökning är en dict med ``fraga`` och valfritt ``malgrupp``,
+    ``kategori``, ``region``, ``sprak`` och ``rankning``; ``sprak`` och
+    ``rankning`` gäller för sökningar som inte anger egna; null räknas som
+    att fältet saknas. Identiska
+    sökningar i samma batch rangordnas bara en gång. Returnerar en dict per
+    sökning, i samma ordning: ``fraga`` plus sok_data() med de BATCH_TRAFFAR
+    bästa träffarna, eller ``fel`` om sökningen är ogiltig.
+    """
+    version = version or katalog.hamta()
+    redan: dict[tuple, tuple[str, Rangordning]] = {}
+    svar = []
+    for sokning in sokningar:
+        if not isinstance(sokning, dict):
+            svar.append({"fraga": None, "fel": "Sökningen måste vara ett objekt, t.ex. {\"fraga\": \"dyr hyra\"}."})
+            continue
+        fel = [falt for falt in BATCH_FALT if not isinstance(sokning.get(falt) or "", str)]
+        if fel:
+            svar.append({"fraga": None, "fel": f"Fälten {', '.join(fel)} måste vara text."})
+            continue
+        sokning = {falt: sokning.get(falt) or "" for falt in BATCH_FALT}
+        fraga = sokning["fraga"]
+        if not fraga.strip():
+            svar.append({"fraga": fraga, "fel": "Sökningen saknar fraga."})
+            continue
+        rank = sokning["rankning"] or rankning or STANDARD_RANKNING
+        lang = sokning["sprak"] or sprak
+        if rank not in RANKNINGAR:
+            svar.append({"fraga": fraga, "fel": f"Okänd rankning '{rank}'. Välj bland: {', '.join(RANKNINGAR)}."})
+            continue
+
+        filter_ = (sokning["malgrupp"], sokning["kategori"], sokning["region"])
+        nyckel = (fraga, *filter_, rank)
+        if nyckel not in redan:
+            redan[nyckel] = sok(version, fraga, *filter_, rank)
+        fraga_norm, resultat = redan[nyckel]
+
+        svar.append({"fraga": fraga, **sok_data(version, fraga_norm, resultat, lang, BATCH_TRAFFAR)})
+    return svar
+
+
+# ── Strukturerade svar ────────────────────────────────────────────
+#
+# Verktygen bygger först svaret som dicts och listor. format="json" skickar
+# dem som de är; markdown renderas ovanpå samma data.
+
+FORMAT = ("markdown", "json")
+
+
+def till_json(data) -> str:
+    """Kompakt JSON för format="json"."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def okant_format(format: str) -> str | None:
+    """Felmeddelande om ``format`` inte stöds, annars None."""
+    if format in FORMAT:
+        return None
+    return f"Okänt format '{format}'. Välj bland: {', '.join(FORMAT)}."
+
+
+def stod_data(version: KatalogVersion, dok: int, sprak: str = "sv", fullstandig: bool = False) -> dict:
+    """Stöd ``dok`` med namn och beskrivning på ``sprak``; med villkor och länkar om ``fullstandig``."""
+    stod = version.stod[dok]
+    data = {
+        "id": stod["id"],
+        "namn": get_name(stod, sprak),
+        "beskrivning": get_description(stod, sprak),
+        "myndighet": stod["myndighet"],
+        "malgrupp": stod["malgrupp"],
+        "kategori": stod.get("kategori"),
+        "region": stod.get("region"),
+        "belopp": stod["belopp"],
+        "info_url": stod.get("info_url"),
+        "inaktuell": bool(version.aktualitet.flagga(dok)),
+    }
+    if fullstandig:
+        data["villkor"] = stod.get("villkor", [])
+        data["ansokan_url"] = stod.get("ansokan_url")
+        data["senast_verifierad"] = stod.get("senast_verifierad")
+    return data
+
+
+def sok_data(
+    version: KatalogVersion,
+    fraga_norm: str,
+    resultat: Rangordning,
+    sprak: str = "sv",
+    antal: int = SOK_ANTAL,
+    start: int = 0,
+) -> dict:
+    """En sida sökresultat: antal träffar, stavningsrättningar, stöden med poäng och cursor till nästa sida."""
+    sida = resultat.sida(start, antal)
+    return {
+        "antal": len(resultat),
+        "rattningar": dict(version.analysator.analysera_fraga(fraga_norm).rattningar),
+        "start": start,
+        "resultat": [{**stod_data(version, dok, sprak), "poang": round(poang, 3)} for poang, dok in sida],
+        "nasta": skapa_cursor(resultat, start + antal) if start + antal < len(resultat) else None,
+    }
+
+
+def lista_data(version: KatalogVersion, malgrupp: str = "", sprak: str = "sv") -> dict:
+    """Alla stöd för en normaliserad målgrupp (tom = alla), sorterade på kategori."""
+    urval = version.filter.urval(malgrupp=malgrupp)
+    alla_dok = list(range(len(version.stod)) if urval is None else urval)
+    sorterade = sorted(alla_dok, key=lambda dok: version.stod[dok].get("kategori", "övrigt"))
+    return {
+        "antal": len(sorterade),
+        "malgrupp": malgrupp,
+        "stod": [stod_data(version, dok, sprak) for dok in sorterade],
+    }
+
+
+def statistik_data(version: KatalogVersion) -> dict:
+    """Databasstatistik för en katalogversion."""
+    alla_stod = version.stod
+    kategorier, malgrupper, myndigheter = {}, {}, {}
+    regionala = 0
+    sprak_count = {"en": 0, "ar": 0}
+
+    for stod in alla_stod:
+        kat = stod.get("kategori", "övrigt")
+        kategorier[kat] = kategorier.get(kat, 0) + 1
+        for mg in stod["malgrupp"]:
+            malgrupper[mg] = malgrupper.get(mg, 0) + 1
+        myn = stod["myndighet"]
+        myndigheter[myn] = myndigheter.get(myn, 0) + 1
+        if stod.get("region", "nationellt") != "nationellt":
+            regionala += 1
+        if stod.get("namn_en"):
+            sprak_count["en"] += 1
+        if stod.get("namn_ar"):
+            sprak_count["ar"] += 1
+
+    return {
+        "version": version.version,
+        "totalt": len(alla_stod),
+        "regionala": regionala,
+        "inaktuella": len(version.aktualitet.inaktuella()),
+        "oversatta": sprak_count,
+        "per_kategori": dict(sorted(kategorier.items())),
+        "per_malgrupp": dict(sorted(malgrupper.items())),
+        "per_myndighet": dict(sorted(myndigheter.items())),
+    }
+
+
+# ── Etiketter och textfragment ────────────────────────────────────
+
+# Fasta texter per språk. Okända språk får svenska, precis som namn och
+# beskrivningar i get_name()/get_description().
+ETIKETTER = {
+    "sv": {
+        "myndighet": "Myndighet",
+        "malgrupp": "Målgrupp",
+        "kategori": "Kategori",
+        "region": "Region",
+        "beskrivning": "Beskrivning",
+        "villkor": "Villkor",
+        "belopp": "Belopp",
+        "lankar": "Länkar",
+        "ansokan": "Ansökan",
+        "mer_info": "Mer info",
+        "senast_verifierad": "Senast verifierad",
+        "inaktuell": "⚠️ Informationen kan vara inaktuell.",
+        "hittade": "Hittade {antal} möjliga stöd (visar topp {visade}):",
+        "hittade_sida": "Hittade {antal} möjliga stöd (visar {fran}–{till}):",
+        "fler": 'Fler träffar finns — anropa sok_stod igen med samma fråga och cursor="{cursor}".',
+        "inga_fler": "Inga fler träffar.",
+        "inga_traffar": "Hittade inga stöd som matchar din sökning. Prova att beskriva din situation med andra ord, eller använd lista_stod() för att se alla.",
+        "rattad_stavning": "Rättad stavning",
+        "forklaring": "Förklaring",
+        "poang": "poäng",
+        "hela_termen": "hela termen",
+        "tider": "Tider (ms)",
+        "totalt": "Totalt {antal} stöd",
+        "filtrerat": " (filtrerat: {malgrupp})",
+        "inga_stod": "Inga stöd hittades.",
+        "inget_id": "Hittade inget stöd med ID '{stod_id}'.",
+    },
+    "en": {
+        "myndighet": "Authority",
+        "malgrupp": "Target",
+        "kategori": "Category",
+        "region": "Region",
+        "beskrivning": "Description",
+        "villkor": "Requirements",
+        "belopp": "Amount",
+        "lankar": "Links",
+        "ansokan": "Apply",
+        "mer_info": "More info",
+        "senast_verifierad": "Last verified",
+        "inaktuell": "⚠️ Information may be outdated.",
+        "hittade": "Found {antal} potential benefits (showing top {visade}):",
+        "hittade_sida": "Found {antal} potential benefits (showing {fran}–{till}):",
+        "fler": 'More results available — call sok_stod again with the same query and cursor="{cursor}".',
+        "inga_fler": "No more results.",
+        "inga_traffar": "No matching benefits found. Try describing your situation differently, or use lista_stod() to see all available benefits.",
+        "rattad_stavning": "Spelling corrected",
+        "forklaring": "Explanation",
+        "poang": "points",
+        "hela_termen": "whole term",
+        "tider": "Timings (ms)",
+        "totalt": "Total {antal} benefits",
+        "filtrerat": " (filtered: {malgrupp})",
+        "inga_stod": "No benefits found.",
+        "inget_id": "No benefit found with ID '{stod_id}'.",
+    },
+    "ar": {
+        "myndighet": "الجهة المسؤولة",
+        "malgrupp": "الفئة المستهدفة",
+        "kategori": "الفئة",
+        "region": "المنطقة",
+        "beskrivning": "الوصف",
+        "villkor": "الشروط",
+        "belopp": "المبلغ",
+        "lankar": "الروابط",
+        "ansokan": "التقديم",
+        "mer_info": "مزيد من المعلومات",
+        "senast_verifierad": "آخر تحقق",
+        "inaktuell": "⚠️ قد تكون المعلومات قديمة.",
+        "hittade": "تم العثور على {antal} دعم محتمل:",
+        "hittade_sida": "تم العثور على {antal} دعم محتمل ({fran}–{till}):",
+        "fler": 'توجد نتائج أخرى — استدعِ sok_stod مرة أخرى بنفس السؤال مع cursor="{cursor}".',
+        "inga_fler": "لا توجد نتائج أخرى.",
+        "inga_traffar": "لم يتم العثور على دعم مطابق. حاول وصف وضعك بشكل مختلف.",
+        "rattad_stavning": "تصحيح الإملاء",
+        "forklaring": "شرح الترتيب",
+        "poang": "نقاط",
+        "hela_termen": "المصطلح كاملاً",
+        "tider": "الأوقات (ms)",
+        "totalt": "إجمالي {antal} دعم",
+        "filtrerat": " (مصفّى: {malgrupp})",
+        "inga_stod": "لم يتم العثور على أي دعم.",
+        "inget_id": "لم يتم العثور على دعم بالمعرّف '{stod_id}'.",
+    },
+}
+FLAGGA = " ⚠️"  # efter namnet på stöd som kan vara inaktuella
+
+
+def etiketter(sprak: str) -> dict[str, str]:
+    """Etikettabellen för ``sprak``, svenska för okända språk."""
+    return ETIKETTER.get(sprak, ETIKETTER["sv"])
+
+
+def sok_fragment(stod: dict, sprak: str) -> tuple[str, str]:
+    """Ett stöds block i sok_stod-svaret, delat där inaktualitetsflaggan ska in."""
+    e = etiketter(sprak)
+    return (
+        f"### {get_name(stod, sprak)}",
+        f"\n**{e['myndighet']}:** {stod['myndighet']}\n"
+        f"**{e['malgrupp']}:** {', '.join(stod['malgrupp'])}\n"
+        f"**{e['beskrivning']}:** {get_description(stod, sprak)}\n"
+        f"**{e['belopp']}:** {stod['belopp']}\n"
+        f"**{e['mer_info']}:** {stod.get('info_url', '-')}\n"
+        f"**ID:** {stod['id']}",
+    )
+
+
+def lista_fragment(stod: dict, sprak: str) -> tuple[str, str]:
+    """Ett stöds rad i lista_stod-svaret, delad där inaktualitetsflaggan ska in."""
+    region_tag = f" 📍{stod['region']}" if stod.get("region") not in ["nationellt", "", None] else ""
+    return (
+        f"- **{get_name(stod, sprak)}**",
+        f"{region_tag} ({stod['myndighet']}) — {get_description(stod, sprak)} [ID: {stod['id']}]",
+    )
+
+
+def detalj_fragment(stod: dict, sprak: str) -> str:
+    """stod_detaljer-texten för ett stöd, utan inaktualitetsvarning."""
+    e = etiketter(sprak)
+    villkor_lista = "\n".join(f"  • {v}" for v in stod.get("villkor", []))
+    return (
+        f"# {get_name(stod, sprak)}\n\n"
+        f"**{e['myndighet']}:** {stod['myndighet']}\n"
+        f"**{e['malgrupp']}:** {', '.join(stod['malgrupp'])}\n"
+        f"**{e['kategori']}:** {stod.get('kategori', '-')}\n"
+        f"**{e['region']}:** {stod.get('region', '-')}\n\n"
+        f"## {e['beskrivning']}\n{get_description(stod, sprak)}\n\n"
+        f"## {e['villkor']}\n{villkor_lista}\n\n"
+        f"## {e['belopp']}\n{stod['belopp']}\n\n"
+        f"## {e['lankar']}\n"
+        f"- {e['ansokan']}: {stod.get('ansokan_url') or '-'}\n"
+        f"- {e['mer_info']}: {stod.get('info_url', '-')}\n\n"
+        f"{e['senast_verifierad']}: {stod.get('senast_verifierad', '?')}"
+    )
+
+
+class Textfragment:
+    """Färdigformaterade textbitar per stöd och språk för en katalogversion.
+
+    Allt som bara beror på stödet och språket formateras när versionen läses
+    in, så att ett svar bara är att foga ihop strängar. Inaktualitets-
+    flaggan beror på dagens datum och läggs till vid rendering. Språk
+    utanför SUPPORTED_LANGUAGES formateras vid behov.
+    """
+
+    def __init__(self, stod: list[dict]):
+        self._stod = stod
+        self.sok = {sprak: [sok_fragment(s, sprak) for s in stod] for sprak in SUPPORTED_LANGUAGES}
+        self.lista = {sprak: [lista_fragment(s, sprak) for s in stod] for sprak in SUPPORTED_LANGUAGES}
+        self.detaljer = {sprak: [detalj_fragment(s, sprak) for s in stod] for sprak in SUPPORTED_LANGUAGES}
+
+    def sok_block(self, dok: int, sprak: str, flagga: str = "") -> str:
+        fragment = self.sok.get(sprak)
+        huvud, kropp = fragment[dok] if fragment else sok_fragment(self._stod[dok], sprak)
+        return huvud + flagga + kropp
+
+    def lista_rad(self, dok: int, sprak: str, flagga: str = "") -> str:
+        fragment = self.lista.get(sprak)
+        huvud, kropp = fragment[dok] if fragment else lista_fragment(self._stod[dok], sprak)
+        return huvud + flagga + kropp
+
+    def detalj_text(self, dok: int, sprak: str) -> str:
+        fragment = self.detaljer.get(sprak)
+        return fragment[dok] if fragment else detalj_fragment(self._stod[dok], sprak)
+
+
+# ── Förrenderade listor och statistik ─────────────────────────────
+
+
+def formatera_lista(version: KatalogVersion, malgrupp: str = "", sprak: str = "sv") -> str:
+    """lista_stod-texten för en normaliserad målgrupp (tom = alla)."""
+    e = etiketter(sprak)
+    urval = version.filter.urval(malgrupp=malgrupp)
+    alla_dok = list(range(len(version.stod)) if urval is None else urval)
+
+    if not alla_dok:
+        return e["inga_stod"]
+
+    output = []
+    nuvarande_kategori = ""
+    sorterade = sorted(alla_dok, key=lambda dok: version.stod[dok].get("kategori", "övrigt"))
+
+    for dok in sorterade:
+        kat = version.stod[dok].get("kategori", "övrigt").capitalize()
+        if kat != nuvarande_kategori:
+            nuvarande_kategori = kat
+            output.append(f"\n## {nuvarande_kategori}")
+        output.append(version.fragment.lista_rad(dok, sprak, version.aktualitet.flagga(dok)))
+
+    header = e["totalt"].format(antal=len(alla_dok))
+    if malgrupp:
+        header += e["filtrerat"].format(malgrupp=malgrupp)
+    header += ":\n"
+
+    return header + "\n".join(output)
+
+
+def formatera_statistik(version: KatalogVersion) -> str:
+    """stod_statistik-texten för en katalogversion."""
+    data = statistik_data(version)
+    kat_str = "\n".join(f"  - {k}: {v}" for k, v in data["per_kategori"].items())
+    mg_str = "\n".join(f"  - {k}: {v}" for k, v in data["per_malgrupp"].items())
+    myn_str = "\n".join(f"  - {k}: {v}" for k, v in data["per_myndighet"].items())
+
+    return (
+        f"# Stödlotsen — Databasstatistik\n\n"
+        f"**Totalt:** {data['totalt']} stöd\n"
+        f"**Regionala:** {data['regionala']}\n"
+        f"**Potentiellt inaktuella:** {data['inaktuella']}\n"
+        f"**Översatta till engelska:** {data['oversatta']['en']}\n"
+        f"**Översatta till arabiska:** {data['oversatta']['ar']}\n\n"
+        f"## Per kategori\n{kat_str}\n\n"
+        f"## Per målgrupp\n{mg_str}\n\n"
+        f"## Per myndighet\n{myn_str}"
+    )
+
+
+class Forrendering:
+    """lista_stod- och stod_statistik-svar, färdigrenderade per version och dag.
+
+    Texterna ändras bara när katalogen eller datumet ändras (inaktualitets-
+    flaggan beror på dagens datum). Listorna för alla kombinationer av
+    målgrupp, språk och format renderas i en bakgrundstråd som startas när
+    en ny version laddats eller första anropet efter midnatt; tills den är
+    klar returnerar lista() None och anroparen renderar bara sin egen
+    kombination. Statistiken renderas för sig, per format, vid första anropet.
+    """
+
+    def __init__(self):
+        # (nyckel, texter) i ett objekt, så att lista() utan lås aldrig får
+        # en ny nyckel ihop med texter från föregående version eller dag
+        self._listor: tuple[tuple | None, dict] = (None, {})
+        self._pagaende: tuple | None = None
+        self._statistik_nyckel: tuple | None = None
+        self._statistik: dict = {}
+        self._las = threading.Lock()
+        self.trad: threading.Thread | None = None
+
+    def bygg_i_bakgrunden(self, version: KatalogVersion) -> None:
+        """Startar renderingen av alla listor för ``version`` om den inte redan finns eller pågår."""
+        nyckel = (version.version, date.today())
+        with self._las:
+            if nyckel in (self._listor[0], self._pagaende):
+                return
+            self._pagaende = nyckel
+            self.trad = threading.Thread(target=self._bygg, args=(version, nyckel), daemon=True, name="forrendering")
+            self.trad.start()
+
+    def _bygg(self, version: KatalogVersion, nyckel: tuple) -> None:
+        try:
+            texter = self._rendera_listor(version)
+        except Exception:
+            texter = None
+        with self._las:
+            if self._pagaende == nyckel:
+                self._pagaende = None
+                if texter is not None:
+                    self._listor = (nyckel, texter)
+
+    def lista(self, version: KatalogVersion, malgrupp: str, sprak: str, format: str) -> str | None:
+        """Färdig lista_stod-text, eller None om den inte är renderad än."""
+        nyckel, texter = self._listor
+        if nyckel != (version.version, date.today()):
+            self.bygg_i_bakgrunden(version)
+            return None
+        return texter.get((malgrupp, sprak, format))
+
+    def statistik(self, version: KatalogVersion, format: str) -> str:
+        """stod_statistik-texten, renderad en gång per version, dag och format."""
+        nyckel = (version.version, date.today())
+        with self._las:
+            if self._statistik_nyckel != nyckel:
+                self._statistik_nyckel, self._statistik = nyckel, {}
+            text = self._statistik.get(format)
+            if text is None:
+                text = formatera_statistik(version) if format == "markdown" else till_json(statistik_data(version))
+                self._statistik[format] = text
+        return text
+
+    @staticmethod
+    def _rendera_listor(version: KatalogVersion) -> dict:
+        """{(målgrupp, språk, format): text} för alla kombinationer."""
+        malgrupper = [""] + sorted(version.filter.malgrupp)
+        return {
+            (malgrupp, sprak, format): (
+                formatera_lista(version, malgrupp, sprak)
+                if format == "markdown"
+                else till_json(lista_data(version, malgrupp, sprak))
+            )
+            for malgrupp in malgrupper
+            for sprak in SUPPORTED_LANGUAGES
+            for format in FORMAT
+        }
+
+
+forrendering = Forrendering()
+katalog.vid_ny_version.append(forrendering.bygg_i_bakgrunden)
+
+
+# ── Mätvärden ─────────────────────────────────────────────────────
+
+# Hinkgränser för svarstider (sekunder) och antal träffar per anrop
+LATENS_GRANSER = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RESULTAT_GRANSER = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000, 10000)
+
+
+class Histogram:
+    """Histogram med fasta hinkgränser, som i Prometheus (``le``)."""
+
+    def __init__(self, granser: tuple):
+        self.granser = granser
+        self.hinkar = [0] * (len(granser) + 1)  # sista hinken är +Inf
+        self.antal = 0
+        self.summa = 0.0
+
+    def registrera(self, varde: float) -> None:
+        self.hinkar[bisect.bisect_left(self.granser, varde)] += 1
+        self.antal += 1
+        self.summa += varde
+
+    def kumulativ(self) -> list[tuple[float, int]]:
+        """(övre gräns, antal värden ≤ gränsen), sist (inf, antal)."""
+        rader, summa = [], 0
+        for grans, antal in zip(self.granser + (math.inf,), self.hinkar):
+            summa += antal
+            rader.append((grans, summa))
+        return rader
+
+    def kvantil(self, q: float) -> float | None:
+        """Övre gränsen för hinken där kvantilen ``q`` hamnar."""
+        if not self.antal:
+            return None
+        for grans, antal in self.kumulativ():
+            if antal >= q * self.antal:
+                return grans
+        return math.inf
+
+
+class Verktygsmatning:
+    """Mätvärden för ett verktyg."""
+
+    def __init__(self):
+        self.anrop = Histogram(LATENS_GRANSER)  # svarstider
+        self.resultat = Histogram(RESULTAT_GRANSER)  # antal träffar, om verktyget rapporterar det
+        self.fel = 0  # anrop som slutat med undantag
+
+
+class Matvarden:
+    """Processgemensamma räknare för MCP-verktygen.
+
+    Varje verktyg mäts av dekoratorn ``matt``: antal anrop, svarstider,
+    undantag och — om verktyget anropar ``resultat()`` — antal träffar.
+    Cache- och katalogräknarna läses från sok_cache och katalog när
+    mätvärdena hämtas.
+    """
+
+    def __init__(self):
+        self._las = threading.Lock()
+        self._verktyg: dict[str, Verktygsmatning] = {}
+        self.startad = time.time()
+
+    def _matning(self, verktyg: str) -> Verktygsmatning:
+        matning = self._verktyg.get(verktyg)
+        if matning is None:
+            matning = Verktygsmatning()
+            self._verktyg[verktyg] = matning
+        return matning
+
+    def anrop(self, verktyg: str, sekunder: float, fel: bool = False) -> None:
+        with self._las:
+            matning = self._matning(verktyg)
+            matning.anrop.registrera(sekunder)
+            if fel:
+                matning.fel += 1
+
+    def resultat(self, verktyg: str, antal: int) -> None:
+        with self._las:
+            self._matning(verktyg).resultat.registrera(antal)
+
+    def data(self) -> dict:
+        """Alla mätvärden som en dict (för JSON).
+
+        Kvantilerna är övre hinkgränsen i sekunder; None om verktyget inte
+        anropats eller om kvantilen ligger över största gränsen.
+        """
+
+        def sekunder(varde: float | None) -> float | None:
+            return None if varde is None or varde == math.inf else varde
+
+        with self._las:
+            verktyg = {
+                namn: {
+                    "anrop": m.anrop.antal,
+                    "fel": m.fel,
+                    "tid_s": round(m.anrop.summa, 6),
+                    "p50_s": sekunder(m.anrop.kvantil(0.5)),
+                    "p95_s": sekunder(m.anrop.kvantil(0.95)),
+                    "p99_s": sekunder(m.anrop.kvantil(0.99)),
+                    "resultat_medel": round(m.resultat.summa / m.resultat.antal, 2) if m.resultat.antal else None,
+                }
+                for namn, m in sorted(self._verktyg.items())
+            }
+        return {
+            "upptid_s": round(time.time() - self.startad),
+            "verktyg": verktyg,
+            "cache": sok_cache.statistik(),
+            "katalog": katalog.statistik(),
+            "fragelogg": fragelogg.statistik() if fragelogg is not None else None,
+        }
+
+    def prometheus(self) -> str:
+        """Mätvärdena i Prometheus textformat (för /metrics)."""
+        rader = []
+
+        def metrik(namn: str, typ: str, hjalp: str) -> None:
+            rader.append(f"# HELP {namn} {hjalp}")
+            rader.append(f"# TYPE {namn} {typ}")
+
+        def histogram(namn: str, falt: str) -> None:
+            for verktyg, m in verktyg_lista:
+                h = getattr(m, falt)
+                if not h.antal:
+                    continue
+                for grans, antal in h.kumulativ():
+                    le = "+Inf" if grans == math.inf else f"{grans:g}"
+                    rader.append(f'{namn}_bucket{{tool="{verktyg}",le="{le}"}} {antal}')
+                rader.append(f'{namn}_sum{{tool="{verktyg}"}} {h.summa:g}')
+                rader.append(f'{namn}_count{{tool="{verktyg}"}} {h.antal}')
+
+        with self._las:
+            verktyg_lista = sorted(self._verktyg.items())
+            metrik("stodlotsen_tool_calls_total", "counter", "Antal anrop per verktyg.")
+            for verktyg, m in verktyg_lista:
+                rader.append(f'stodlotsen_tool_calls_total{{tool="{verktyg}"}} {m.anrop.antal}')
+            metrik("stodlotsen_tool_errors_total", "counter", "Anrop som slutat med undantag.")
+            for verktyg, m in verktyg_lista:
+                rader.append(f'stodlotsen_tool_errors_total{{tool="{verktyg}"}} {m.fel}')
+            metrik("stodlotsen_tool_latency_seconds", "histogram", "Svarstid per verktyg.")
+            histogram("stodlotsen_tool_latency_seconds", "anrop")
+            metrik("stodlotsen_tool_results", "histogram", "Antal träffar per anrop.")
+            histogram("stodlotsen_tool_results", "resultat")
+
+        cache = sok_cache.statistik()
+        for nyckel, namn, hjalp in (
+            ("traffar", "stodlotsen_cache_hits_total", "Träffar i sökcachen."),
+            ("missar", "stodlotsen_cache_misses_total", "Missar i sökcachen."),
+            ("utkastade", "stodlotsen_cache_evictions_total", "Poster utkastade ur sökcachen."),
+            ("utgangna", "stodlotsen_cache_expired_total", "Poster i sökcachen vars TTL gått ut."),
+            ("invalideringar", "stodlotsen_cache_invalidations_total", "Tömningar av sökcachen vid ny katalogversion."),
+        ):
+            metrik(namn, "counter", hjalp)
+            rader.append(f"{namn} {cache[nyckel]}")
+        metrik("stodlotsen_cache_entries", "gauge", "Poster i sökcachen.")
+        rader.append(f"stodlotsen_cache_entries {cache['storlek']}")
+        metrik("stodlotsen_cache_scored_docs", "gauge", "Poängsatta stöd i sökcachens poster sammanlagt.")
+        rader.append(f"stodlotsen_cache_scored_docs {cache['traffar_i_cachen']}")
+
+        kat = katalog.statistik()
+        metrik("stodlotsen_catalog_reloads_total", "counter", "Inlästa katalogversioner.")
+        rader.append(f"stodlotsen_catalog_reloads_total {kat['laddningar']}")
+        metrik("stodlotsen_catalog_reload_seconds_total", "counter", "Sammanlagd tid för att bygga katalogversioner.")
+        rader.append(f"stodlotsen_catalog_reload_seconds_total {kat['laddningstid_s']:g}")
+        metrik("stodlotsen_catalog_last_reload_seconds", "gauge", "Tid för att bygga senaste katalogversionen.")
+        rader.append(f"stodlotsen_catalog_last_reload_seconds {kat['senaste_laddningstid_s']:g}")
+        metrik("stodlotsen_catalog_benefits", "gauge", "Antal stöd i aktuell katalogversion.")
+        rader.append(f"stodlotsen_catalog_benefits {kat['antal_stod']}")
+        if kat["version"] is not None:
+            metrik("stodlotsen_catalog_info", "gauge", "Aktuell katalogversion.")
+            rader.append(f'stodlotsen_catalog_info{{version="{kat["version"]}"}} 1')
+        if fragelogg is not None:
+            logg = fragelogg.statistik()
+            for nyckel, namn, hjalp in (
+                ("skrivna", "stodlotsen_querylog_written_total", "Poster skrivna till frågeloggen."),
+                ("tappade", "stodlotsen_querylog_dropped_total", "Poster som tappats för att kön var full."),
+                ("fel", "stodlotsen_querylog_write_errors_total", "Misslyckade skrivningar till frågeloggen."),
+            ):
+                metrik(namn, "counter", hjalp)
+                rader.append(f"{namn} {logg[nyckel]}")
+        metrik("stodlotsen_uptime_seconds", "gauge", "Sekunder sedan servern startade.")
+        rader.append(f"stodlotsen_uptime_seconds {time.time() - self.startad:.0f}")
+        return "\n".join(rader) + "\n"
+
+
+matvarden = Matvarden()
+
+
+def matt(verktyg):
+    """Dekorator som registrerar anrop, svarstid och undantag i ``matvarden``."""
+    namn = verktyg.__name__
+
+    @functools.wraps(verktyg)
+    def matt_verktyg(*args, **kwargs):
+        start = time.perf_counter()
+        fel = True
+        try:
+            svar = verktyg(*args, **kwargs)
+            fel = False
+            return svar
+        finally:
+            matvarden.anrop(namn, time.perf_counter() - start, fel)
+
+    return matt_verktyg
+
+
+# ── Frågelogg ─────────────────────────────────────────────────────
+
+EPOST_RE = re.compile(r"[^\s@]+@[^\s@]+")
+URL_RE = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+# Personnummer, telefonnummer, kontonummer: tre eller fler siffror i följd,
+# även med mellanslag eller bindestreck. Ålder och antal barn får stå kvar.
+NUMMER_RE = re.compile(r"\+?\d[\d \-]{3,}\d|\d{3,}")
+# Ord och redan utbytta uppgifter; platshållarna ska inte tvättas en gång till
+ORD_RE = re.compile(r"<(?:url|epost|nummer|namn)>|\w+")
+# Vanliga småord som inte finns i katalogen men aldrig är namn. "Hans" och
+# liknande ord som också är förnamn hör inte hit.
+LOGG_STOPPORD = frozenset(
+    """
+    jag du han hon hen vi ni de den det denna detta dessa man min mitt mina din ditt dina sin sitt sina
+    vår vårt våra er ert era deras hennes mig dig oss dem sig och eller men att som om när där här hur
+    vad vilka vilken vilket varför inte ej ja nej så också bara mycket lite mer mest alla allt något
+    några ingen inget inga en ett i på av för till med från ut upp ner över under efter innan utan mot
+    vid hos genom är var har hade ha kan kunde ska skulle vill ville får fick måste behöver bor heter
+    blir blev gör göra ring ringa år månad mamma pappa tack hej snälla
+    i me my you your he she it we they our their is am are was were be have has had do does did can
+    could will would should a an the and or but if to of in on at for with from by about not no yes so
+    this that what how who why when where need needs want get old year years help please hello hi
+    thanks name
+    انا انت هو هي نحن هم في من على الى عن مع و او لا نعم هل ما كيف لماذا متى اين هذا هذه لي لدي عندي
+    اسمي
+    """.split()
+)
+
+
+def anonymisera_fraga(text: str, analysator: Analysator) -> str:
+    """Normaliserad fråga utan uppgifter som kan peka ut en person.
+
+    E-post, länkar och långa nummer byts mot <epost>, <url> och <nummer>.
+    Av övriga ord behålls bara de som finns i katalogen eller
+    synonymtabellen ("Ånge", "Sweden" som sökord) och vanliga småord ur
+    LOGG_STOPPORD; alla andra ord, oavsett skrift och stor eller liten
+    bokstav, byts mot <namn>.
+    """
+    text = URL_RE.sub(" <url> ", text)
+    text = EPOST_RE.sub(" <epost> ", text)
+    text = NUMMER_RE.sub(" <nummer> ", text)
+
+    def namn(m: re.Match) -> str:
+        ord = normalisera(m.group())
+        if ord.startswith("<") or ord.isdigit() or ord in LOGG_STOPPORD:
+            return ord
+        if analysator.ar_kant(ord) or arabisk_stam(ord) in analysator.synonymord:
+            return ord
+        return "<namn>"
+
+    return " ".join(ORD_RE.sub(namn, normalisera(text)).split())
+
+
+class Fragelogg:
+    """Anonymiserad logg över sok_stod-anrop som JSONL, med rotation.
+
+    logga() lägger bara posten i en kö; en bakgrundstråd anonymiserar,
+    serialiserar och skriver kön i klump när den nått ``buffert`` poster
+    eller var ``intervall`` sekund. När filen blir större än
+    ``max_storlek`` byte döps den om till .1 (äldre till .2, …) och de
+    äldsta utöver ``antal_filer`` tas bort. Är kön full tappas poster
+    hellre än att anropen får vänta. Misslyckas en skrivning (full disk,
+    behörighet) räknas den i ``fel``, posterna läggs tillbaka först i kön
+    så långt den räcker och tråden fortsätter försöka.
+    """
+
+    def __init__(
+        self,
+        fil: Path,
+        max_storlek: int,
+        antal_filer: int,
+        buffert: int = 100,
+        intervall: float = 2.0,
+        max_ko: int = 10_000,
+    ):
+        self.fil = fil
+        self.max_storlek = max_storlek
+        self.antal_filer = antal_filer
+        self.buffert = buffert
+        self.intervall = intervall
+        self.max_ko = max_ko
+        self._ko: deque = deque()
+        self._vakna = threading.Event()
+        self._skriv_las = threading.Lock()
+        self._start_las = threading.Lock()
+        self._trad: threading.Thread | None = None
+        self.skrivna = 0
+        self.tappade = 0
+        self.fel = 0
+        atexit.register(self.tom)
+
+    def logga(
+        self,
+        version: KatalogVersion,
+        fraga: str,
+        filter_: tuple[str, str, str],
+        sprak: str,
+        rankning: str,
+        resultat: "Rangordning",
+        start: int,
+        antal: int,
+        sekunder: float,
+    ) -> None:
+        """Köar ett sok_stod-anrop; allt arbete sker i bakgrundstråden."""
+        if len(self._ko) >= self.max_ko:
+            self.tappade += 1
+            return
+        self._ko.append((time.time(), version, fraga, filter_, sprak, rankning, resultat, start, antal, sekunder))
+        if self._trad is None:
+            with self._start_las:
+                if self._trad is None:
+                    self._trad = threading.Thread(target=self._kor, name="fragelogg", daemon=True)
+                    self._trad.start()
+        if len(self._ko) >= self.buffert:
+            self._vakna.set()
+
+    def _kor(self) -> None:
+        while True:
+            self._vakna.wait(self.intervall)
+            self._vakna.clear()
+            self.tom()
+
+    @staticmethod
+    def _post(tid, version, fraga, filter_, sprak, rankning, resultat, start, antal, sekunder) -> dict:
+        malgrupp, kategori, region = filter_
+        return {
+            "tid": datetime.fromtimestamp(tid).isoformat(timespec="minutes"),
+            "version": version.version,
+            "fraga": anonymisera_fraga(fraga, version.analysator),
+            "malgrupp": malgrupp,
+            "kategori": kategori,
+            "region": region,
+            "sprak": sprak,
+            "rankning": rankning,
+            "start": start,
+            "antal": antal,
+            "ms": round(sekunder * 1000, 3),
+            "traffar": len(resultat),
+            "ids": [version.stod[dok]["id"] for _, dok in resultat.sida(start, antal)],
+        }
+
+    def tom(self) -> None:
+        """Skriver allt i kön till filen (anropas också när processen avslutas)."""
+        with self._skriv_las:
+            poster = []
+            while self._ko:
+                poster.append(self._ko.popleft())
+            if not poster:
+                return
+            data = "".join(json.dumps(self._post(*p), ensure_ascii=False) + "\n" for p in poster)
+            try:
+                self.fil.parent.mkdir(parents=True, exist_ok=True)
+                self._rotera(len(data.encode("utf-8")))
+                with open(self.fil, "a", encoding="utf-8") as f:
+                    f.write(data)
+            except OSError:
+                self.fel += 1
+                # Lägg tillbaka posterna först i kön, så långt den räcker
+                plats = min(len(poster), max(0, self.max_ko - len(self._ko)))
+                self.tappade += len(poster) - plats
+                self._ko.extendleft(reversed(poster[len(poster) - plats :]))
+                return
+            self.skrivna += len(poster)
+
+    def statistik(self) -> dict:
+        """Skrivna och tappade poster, misslyckade skrivningar och köns längd."""
+        return {"skrivna": self.skrivna, "tappade": self.tappade, "fel": self.fel, "ko": len(self._ko)}
+
+    def _rotera(self, tillagg: int) -> None:
+        try:
+            storlek = os.stat(self.fil).st_size
+        except OSError:
+            return
+        if storlek == 0 or storlek + tillagg <= self.max_storlek:
+            return
+        for n in range(self.antal_filer - 1, 0, -1):
+            aldre = self.fil.with_name(f"{self.fil.name}.{n}")
+            if aldre.exists():
+                os.replace(aldre, self.fil.with_name(f"{self.fil.name}.{n + 1}"))
+        if self.antal_filer > 0:
+            os.replace(self.fil, self.fil.with_name(f"{self.fil.name}.1"))
+        else:
+            os.remove(self.fil)
+
+
+fragelogg = Fragelogg(Path(FRAGELOGG), FRAGELOGG_STORLEK, FRAGELOGG_ANTAL) if FRAGELOGG else None
+
 
 # ── MCP-server ────────────────────────────────────────────────────
 
@@ -1248,12 +3574,18 @@ mcp = FastMCP(
 
 
 @mcp.tool()
+@matt
 def sok_stod(
     fraga: str,
     malgrupp: str = "",
     kategori: str = "",
     region: str = "",
     sprak: str = "sv",
+    rankning: str = "",
+    format: str = "markdown",
+    antal: int = SOK_ANTAL,
+    cursor: str = "",
+    forklara: bool = False,
 ) -> str:
     """Söker efter relevanta bidrag och stöd baserat på en fritextfråga.
 
@@ -1268,189 +3600,332 @@ def sok_stod(
         kategori: Valfritt filter — t.ex. "bostad", "barn", "anställning", "investering", "energi", "utbildning", "hälsa", "grundtrygghet", "finansiering", "nystart".
         region: Valfritt filter — t.ex. "nationellt", "Västernorrland", "kommunalt".
         sprak: Språk för resultat — "sv" (svenska), "en" (English), "ar" (العربية). Standard: "sv".
+        rankning: Valfritt — "klassisk" (signal/tagg/namn-poäng) eller "bm25". Tomt = serverns standard.
+        format: "markdown" (standard) eller "json" — {"antal", "rattningar", "start", "resultat": [{"id", "namn", "beskrivning", "poang", "inaktuell", ...}], "nasta"}.
+        antal: Antal stöd per sida, 1–50. Standard: 8.
+        cursor: För nästa sida — cursor från föregående svar ("nasta" i JSON), med samma fråga och filter.
+        forklara: Visa hur varje stöds poäng räknats (fält, term, sökord, poäng) och tider per steg i ms. För felsökning av rankningen.
     """
-    alla_stod = ladda_stod()
-    fraga_lower = fraga.lower()
-    sokord = set(fraga_lower.split())
-
-    # Mappa engelska termer till filter
-    malgrupp_map = {"individual": "privatperson", "business": "företag", "person": "privatperson"}
-    if malgrupp.lower() in malgrupp_map:
-        malgrupp = malgrupp_map[malgrupp.lower()]
+    fel = okant_format(format)
+    if fel:
+        return fel
+    rankning = rankning or STANDARD_RANKNING
+    if rankning not in RANKNINGAR:
+        fel = f"Okänd rankning '{rankning}'. Välj bland: {', '.join(RANKNINGAR)}."
+        return till_json({"fel": fel}) if format == "json" else fel
+
+    antal = max(1, min(antal, SOK_MAX_ANTAL))
+
+    tider = {} if forklara else None
+    anropad = tid = time.perf_counter()
+    version = katalog.hamta()
+    laddad = time.perf_counter()
+    fraga_norm, resultat = sok(version, fraga, malgrupp, kategori, region, rankning, tider)
+    matvarden.resultat("sok_stod", len(resultat))
+    start = 0
+    if cursor:
+        start = las_cursor(cursor, resultat)
+        if start is None:
+            fel = (
+                "Ogiltig cursor. Använd cursor från föregående svar, med samma fråga och filter. "
+                "Har databasen uppdaterats sedan dess behöver sökningen göras om."
+            )
+            return till_json({"fel": fel}) if format == "json" else fel
+    if not forklara:
+        if format == "json":
+            svar = till_json(sok_data(version, fraga_norm, resultat, sprak, antal, start))
+        else:
+            svar = formatera_sok(version, fraga_norm, resultat, sprak, antal, start)
+        if fragelogg is not None:
+            filter_ = resultat.nyckel[1:4]
+            sekunder = time.perf_counter() - anropad
+            fragelogg.logga(version, fraga, filter_, sprak, rankning, resultat, start, antal, sekunder)
+        return svar
+
+    tider["laddning"] = laddad - tid
+    tid = time.perf_counter()
+    sida = resultat.sida(start, antal)
+    tider["sortering"] = time.perf_counter() - tid
+    tid = time.perf_counter()
+    if format == "json":
+        data = sok_data(version, fraga_norm, resultat, sprak, antal, start)
+    else:
+        text = formatera_sok(version, fraga_norm, resultat, sprak, antal, start)
+    tider["rendering"] = time.perf_counter() - tid
+    tid = time.perf_counter()
+    forklaring = FORKLARINGAR[rankning](version, fraga_norm, [dok for _, dok in sida])
+    tider["forklaring"] = time.perf_counter() - tid
+    tider_ms = {steg: round(tider[steg] * 1000, 3) for steg in FORKLARING_STEG}
+
+    if format == "json":
+        for post, (_, dok) in zip(data["resultat"], sida):
+            post["forklaring"] = [
+                {"falt": falt, "term": term, "sokord": sokord, "poang": round(poang, 3)}
+                for falt, term, sokord, poang in forklaring[dok]
+            ]
+        data["tider_ms"] = tider_ms
+        return till_json(data)
+    return text + "\n\n" + formatera_forklaring(version, sida, forklaring, tider_ms, sprak)
+
+
+# Stegen som sok_stod(forklara=True) tar tid på, i den ordning de körs
+FORKLARING_STEG = ("laddning", "filter", "poang", "sortering", "rendering", "forklaring")
+
+
+def formatera_forklaring(
+    version: KatalogVersion,
+    sida: list[tuple[float, int]],
+    forklaring: dict[int, list[tuple[str, str, str | None, float]]],
+    tider_ms: dict[str, float],
+    sprak: str = "sv",
+) -> str:
+    """Förklaringsdelen av sok_stod-svaret: poängens delar per stöd och tider per steg."""
+    e = etiketter(sprak)
+    output = [f"## {e['forklaring']}"]
+    for plats, (poang, dok) in enumerate(sida, 1):
+        stod = version.stod[dok]
+        rader = [f"**{plats}. {get_name(stod, sprak)}** (`{stod['id']}`) — {poang:.4g} {e['poang']}"]
+        for falt, term, sokord, del_ in forklaring[dok]:
+            if len(term) > 40:
+                term = term[:39] + "…"
+            kalla = e["hela_termen"] if sokord is None else f'"{sokord}"'
+            rader.append(f'  - {falt} "{term}" ← {kalla}: +{del_:.3g}')
+        output.append("\n".join(rader))
+    output.append(f"*{e['tider']}: " + " · ".join(f"{steg} {ms:.2f}" for steg, ms in tider_ms.items()) + "*")
+    return "\n\n".join(output)
+
+
+def formatera_sok(
+    version: KatalogVersion,
+    fraga_norm: str,
+    resultat: Rangordning,
+    sprak: str = "sv",
+    antal: int = SOK_ANTAL,
+    start: int = 0,
+) -> str:
+    """sok_stod-texten för sidan med ``antal`` stöd från plats ``start``."""
+    e = etiketter(sprak)
+    if not resultat:
+        return e["inga_traffar"]
+    sida = resultat.sida(start, antal)
+    if not sida:
+        return e["inga_fler"]
+
+    output = [version.fragment.sok_block(dok, sprak, version.aktualitet.flagga(dok)) for _, dok in sida]
+    if start == 0:
+        header = e["hittade"].format(antal=len(resultat), visade=len(sida))
+    else:
+        header = e["hittade_sida"].format(antal=len(resultat), fran=start + 1, till=start + len(sida))
+    header += "\n\n"
 
-    resultat = []
+    # Stavningsrättade ord visas så att användaren ser vad som söktes på
+    rattningar = version.analysator.analysera_fraga(fraga_norm).rattningar
+    if rattningar:
+        lista = ", ".join(f"{fel} → {rattat}" for fel, rattat in rattningar)
+        header += f"*{e['rattad_stavning']}: {lista}*\n\n"
+    text = header + "\n\n---\n\n".join(output)
+    if start + antal < len(resultat):
+        text += "\n\n*" + e["fler"].format(cursor=skapa_cursor(resultat, start + antal)) + "*"
+    return text
 
-    for stod in alla_stod:
-        if malgrupp and malgrupp.lower() not in [m.lower() for m in stod["malgrupp"]]:
-            continue
-        if kategori and kategori.lower() != stod.get("kategori", "").lower():
-            continue
-        if region and region.lower() not in stod.get("region", "").lower():
-            continue
 
-        poang = berakna_relevans(stod, fraga_lower, sokord)
-        if poang > 0:
-            resultat.append((poang, stod))
+def formatera_detaljer(version: KatalogVersion, dok: int, sprak: str = "sv") -> str:
+    """Fullständig beskrivning av stöd ``dok`` som markdown."""
+    text = version.fragment.detalj_text(dok, sprak)
+    if version.aktualitet.flagga(dok):
+        text += "\n\n" + etiketter(sprak)["inaktuell"]
+    return text
 
-    resultat.sort(key=lambda x: x[0], reverse=True)
 
-    if not resultat:
-        msgs = {
-            "sv": "Hittade inga stöd som matchar din sökning. Prova att beskriva din situation med andra ord, eller använd lista_stod() för att se alla.",
-            "en": "No matching benefits found. Try describing your situation differently, or use lista_stod() to see all available benefits.",
-            "ar": "لم يتم العثور على دعم مطابق. حاول وصف وضعك بشكل مختلف.",
-        }
-        return msgs.get(sprak, msgs["sv"])
+def inget_stod_med_id(stod_id: str, sprak: str = "sv") -> str:
+    """Felmeddelande för ett okänt stöd-ID."""
+    return etiketter(sprak)["inget_id"].format(stod_id=stod_id)
 
-    output = []
-    for poang, stod in resultat[:8]:
-        flagga = verifierings_flagga(stod)
-        namn = get_name(stod, sprak)
-        beskr = get_description(stod, sprak)
-
-        output.append(
-            f"### {namn}{flagga}\n"
-            f"**{'Myndighet' if sprak == 'sv' else 'Authority'}:** {stod['myndighet']}\n"
-            f"**{'Målgrupp' if sprak == 'sv' else 'Target'}:** {', '.join(stod['malgrupp'])}\n"
-            f"**{'Beskrivning' if sprak == 'sv' else 'Description'}:** {beskr}\n"
-            f"**{'Belopp' if sprak == 'sv' else 'Amount'}:** {stod['belopp']}\n"
-            f"**{'Mer info' if sprak == 'sv' else 'More info'}:** {stod.get('info_url', '-')}\n"
-            f"**ID:** {stod['id']}"
-        )
 
-    headers = {
-        "sv": f"Hittade {len(resultat)} möjliga stöd (visar topp {min(len(resultat), 8)}):\n\n",
-        "en": f"Found {len(resultat)} potential benefits (showing top {min(len(resultat), 8)}):\n\n",
-        "ar": f"تم العثور على {len(resultat)} دعم محتمل:\n\n",
-    }
-    return headers.get(sprak, headers["sv"]) + "\n\n---\n\n".join(output)
+def detaljer_data(version: KatalogVersion, stod_id: str, sprak: str = "sv") -> dict:
+    """Fullständig data om ett stöd, eller {"id", "fel"} om ID:t är okänt."""
+    dok = version.position(stod_id)
+    if dok is None:
+        return {"id": stod_id, "fel": inget_stod_med_id(stod_id, sprak)}
+    return stod_data(version, dok, sprak, fullstandig=True)
 
 
 @mcp.tool()
-def stod_detaljer(stod_id: str, sprak: str = "sv") -> str:
+@matt
+def stod_detaljer(stod_id: str, sprak: str = "sv", format: str = "markdown") -> str:
     """Hämtar fullständig information om ett specifikt stöd.
 
     Args:
         stod_id: ID för stödet, t.ex. "fk-bostadsbidrag". Får du från sok_stod().
         sprak: Språk — "sv", "en", eller "ar". Standard: "sv".
+        format: "markdown" (standard) eller "json".
     """
-    alla_stod = ladda_stod()
+    fel = okant_format(format)
+    if fel:
+        return fel
+    version = katalog.hamta()
+    dok = version.position(stod_id)
+    matvarden.resultat("stod_detaljer", 0 if dok is None else 1)
+    if format == "json":
+        return till_json(detaljer_data(version, stod_id, sprak))
+    if dok is None:
+        return inget_stod_med_id(stod_id, sprak)
+    return formatera_detaljer(version, dok, sprak)
+
+
+@mcp.tool()
+@matt
+def stod_detaljer_flera(stod_ids: list[str], sprak: str = "sv", format: str = "markdown") -> str:
+    """Hämtar fullständig information om flera stöd i ett anrop.
+
+    Args:
+        stod_ids: Lista med ID:n, t.ex. ["fk-bostadsbidrag", "fk-underhallsstod"]. Får du från sok_stod().
+        sprak: Språk — "sv", "en", eller "ar". Standard: "sv".
+        format: "markdown" (standard) eller "json" — en lista i samma ordning som stod_ids.
+    """
+    fel = okant_format(format)
+    if fel:
+        return fel
+    version = katalog.hamta()
+    positioner = [version.position(stod_id) for stod_id in stod_ids]
+    matvarden.resultat("stod_detaljer_flera", sum(dok is not None for dok in positioner))
+    if format == "json":
+        return till_json([detaljer_data(version, stod_id, sprak) for stod_id in stod_ids])
+    output = []
+    for stod_id, dok in zip(stod_ids, positioner):
+        output.append(inget_stod_med_id(stod_id, sprak) if dok is None else formatera_detaljer(version, dok, sprak))
+    return "\n\n---\n\n".join(output)
 
-    for stod in alla_stod:
-        if stod["id"] == stod_id:
-            namn = get_name(stod, sprak)
-            beskr = get_description(stod, sprak)
-            villkor_lista = "\n".join(f"  • {v}" for v in stod.get("villkor", []))
-            flagga = verifierings_flagga(stod)
-            varning = ""
-            if flagga:
-                varning = "\n\n⚠️ Information may be outdated." if sprak == "en" else "\n\n⚠️ Informationen kan vara inaktuell."
-
-            return (
-                f"# {namn}\n\n"
-                f"**{'Myndighet' if sprak == 'sv' else 'Authority'}:** {stod['myndighet']}\n"
-                f"**{'Målgrupp' if sprak == 'sv' else 'Target'}:** {', '.join(stod['malgrupp'])}\n"
-                f"**{'Kategori' if sprak == 'sv' else 'Category'}:** {stod.get('kategori', '-')}\n"
-                f"**{'Region' if sprak == 'sv' else 'Region'}:** {stod.get('region', '-')}\n\n"
-                f"## {'Beskrivning' if sprak == 'sv' else 'Description'}\n{beskr}\n\n"
-                f"## {'Villkor' if sprak == 'sv' else 'Requirements'}\n{villkor_lista}\n\n"
-                f"## {'Belopp' if sprak == 'sv' else 'Amount'}\n{stod['belopp']}\n\n"
-                f"## {'Länkar' if sprak == 'sv' else 'Links'}\n"
-                f"- {'Ansökan' if sprak == 'sv' else 'Apply'}: {stod.get('ansokan_url') or '-'}\n"
-                f"- {'Mer info' if sprak == 'sv' else 'More info'}: {stod.get('info_url', '-')}\n\n"
-                f"{'Senast verifierad' if sprak == 'sv' else 'Last verified'}: {stod.get('senast_verifierad', '?')}"
-                f"{varning}"
-            )
 
-    return f"No benefit found with ID '{stod_id}'." if sprak == "en" else f"Hittade inget stöd med ID '{stod_id}'."
+@mcp.tool()
+@matt
+def sok_stod_batch(sokningar: list[dict], sprak: str = "sv", rankning: str = "") -> str:
+    """Kör många sökningar i ett anrop, mot samma version av databasen.
+
+    Args:
+        sokningar: Lista med sökningar, t.ex. [{"fraga": "dyr hyra", "malgrupp": "privatperson"}, {"fraga": "anställa", "sprak": "en"}]. Varje sökning kan ha fraga, malgrupp, kategori, region, sprak och rankning som i sok_stod().
+        sprak: Språk för sökningar som inte anger eget — "sv", "en" eller "ar". Standard: "sv".
+        rankning: Rankning för sökningar som inte anger egen. Tomt = serverns standard.
+
+    Returnerar JSON: {"version": ..., "sokningar": [{"fraga", "antal", "rattningar", "resultat": [...]}]},
+    med resultat som i sok_stod(format="json").
+    """
+    if len(sokningar) > BATCH_MAX:
+        return till_json({"fel": f"För många sökningar ({len(sokningar)}). Max {BATCH_MAX} per anrop."})
+    version = katalog.hamta()
+    svar = sok_batch(sokningar, sprak, rankning, version)
+    for sokning in svar:
+        if "antal" in sokning:
+            matvarden.resultat("sok_stod_batch", sokning["antal"])
+    return till_json({"version": version.version, "sokningar": svar})
 
 
 @mcp.tool()
-def lista_stod(malgrupp: str = "", sprak: str = "sv") -> str:
+@matt
+def lista_stod(malgrupp: str = "", sprak: str = "sv", format: str = "markdown") -> str:
     """Listar alla tillgängliga stöd i databasen.
 
     Args:
         malgrupp: "privatperson" / "individual" eller "företag" / "business". Tomt = alla.
         sprak: Språk — "sv", "en", eller "ar". Standard: "sv".
+        format: "markdown" (standard) eller "json" — {"antal", "malgrupp", "stod": [...]}.
     """
-    alla_stod = ladda_stod()
+    fel = okant_format(format)
+    if fel:
+        return fel
+    version = katalog.hamta()
     malgrupp_map = {"individual": "privatperson", "business": "företag", "person": "privatperson"}
-    if malgrupp.lower() in malgrupp_map:
-        malgrupp = malgrupp_map[malgrupp.lower()]
-
-    if malgrupp:
-        alla_stod = [s for s in alla_stod if malgrupp.lower() in [m.lower() for m in s["malgrupp"]]]
-
-    if not alla_stod:
-        return "Inga stöd hittades." if sprak == "sv" else "No benefits found."
-
-    output = []
-    nuvarande_kategori = ""
-    sorterade = sorted(alla_stod, key=lambda s: s.get("kategori", "övrigt"))
+    malgrupp = normalisera(malgrupp)
+    malgrupp = malgrupp_map.get(malgrupp, malgrupp)
+    urval = version.filter.urval(malgrupp=malgrupp)
+    matvarden.resultat("lista_stod", len(version.stod) if urval is None else len(urval))
 
-    for stod in sorterade:
-        kat = stod.get("kategori", "övrigt").capitalize()
-        if kat != nuvarande_kategori:
-            nuvarande_kategori = kat
-            output.append(f"\n## {nuvarande_kategori}")
+    text = forrendering.lista(version, malgrupp, sprak, format)
+    if text is not None:
+        return text
+    if format == "json":
+        return till_json(lista_data(version, malgrupp, sprak))
+    return formatera_lista(version, malgrupp, sprak)
 
-        namn = get_name(stod, sprak)
-        beskr = get_description(stod, sprak)
-        flagga = verifierings_flagga(stod)
-        region_tag = f" 📍{stod['region']}" if stod.get("region") not in ["nationellt", ""] else ""
-        output.append(f"- **{namn}**{flagga}{region_tag} ({stod['myndighet']}) — {beskr} [ID: {stod['id']}]")
 
-    header = f"Totalt {len(alla_stod)} stöd"
-    if malgrupp:
-        header += f" (filtrerat: {malgrupp})"
-    header += ":\n"
+@mcp.tool()
+@matt
+def stod_statistik(format: str = "markdown") -> str:
+    """Visar statistik om stöddatabasen.
 
-    return header + "\n".join(output)
+    Args:
+        format: "markdown" (standard) eller "json".
+    """
+    fel = okant_format(format)
+    if fel:
+        return fel
+    return forrendering.statistik(katalog.hamta(), format)
+
+
+def formatera_matvarden(data: dict) -> str:
+    """stod_matvarden-texten: en tabell per verktyg plus cache och katalog."""
+
+    def ms(sekunder: float | None) -> str:
+        return "–" if sekunder is None else f"≤ {sekunder * 1000:g}"
+
+    rader = [
+        "| Verktyg | Anrop | Fel | Medel (ms) | p50 (ms) | p95 (ms) | p99 (ms) | Träffar (medel) |",
+        "|---------|-------|-----|------------|----------|----------|----------|-----------------|",
+    ]
+    for namn, v in data["verktyg"].items():
+        medel = f"{v['tid_s'] / v['anrop'] * 1000:.2f}" if v["anrop"] else "–"
+        traffar = "–" if v["resultat_medel"] is None else f"{v['resultat_medel']:g}"
+        rader.append(
+            f"| {namn} | {v['anrop']} | {v['fel']} | {medel} | {ms(v['p50_s'])} "
+            f"| {ms(v['p95_s'])} | {ms(v['p99_s'])} | {traffar} |"
+        )
+    cache, kat = data["cache"], data["katalog"]
+    return (
+        f"# Stödlotsen — Mätvärden\n\n"
+        f"**Upptid:** {data['upptid_s']} s\n\n"
+        f"## Verktyg\n" + "\n".join(rader) + "\n\n"
+        f"## Sökcache\n"
+        f"  - träffar: {cache['traffar']}\n"
+        f"  - missar: {cache['missar']}\n"
+        f"  - utkastade: {cache['utkastade']}\n"
+        f"  - poster: {cache['storlek']}/{cache['max_antal']}\n"
+        f"  - poängsatta stöd: {cache['traffar_i_cachen']}/{cache['max_traffar']}\n\n"
+        f"## Katalog\n"
+        f"  - version: {kat['version']} ({kat['antal_stod']} stöd)\n"
+        f"  - laddningar: {kat['laddningar']}\n"
+        f"  - senaste laddning: {kat['senaste_laddningstid_s'] * 1000:.0f} ms"
+        + (f"\n  - senaste fel: {kat['senaste_fel']}" if kat["senaste_fel"] else "")
+        + (
+            f"\n\n## Frågelogg\n"
+            f"  - skrivna: {logg['skrivna']}\n"
+            f"  - tappade: {logg['tappade']}\n"
+            f"  - misslyckade skrivningar: {logg['fel']}"
+            if (logg := data.get("fragelogg"))
+            else ""
+        )
+    )
 
 
 @mcp.tool()
-def stod_statistik() -> str:
-    """Visar statistik om stöddatabasen."""
-    alla_stod = ladda_stod()
-    kategorier, malgrupper, myndigheter = {}, {}, {}
-    inaktuella, regionala = 0, 0
-    sprak_count = {"en": 0, "ar": 0}
+@matt
+def stod_matvarden(format: str = "markdown") -> str:
+    """Visar serverns mätvärden: anrop, svarstider och träffar per verktyg, sökcachen och katalogladdningar.
 
-    for stod in alla_stod:
-        kat = stod.get("kategori", "övrigt")
-        kategorier[kat] = kategorier.get(kat, 0) + 1
-        for mg in stod["malgrupp"]:
-            malgrupper[mg] = malgrupper.get(mg, 0) + 1
-        myn = stod["myndighet"]
-        myndigheter[myn] = myndigheter.get(myn, 0) + 1
-        if stod.get("region", "nationellt") != "nationellt":
-            regionala += 1
-        if stod.get("namn_en"):
-            sprak_count["en"] += 1
-        if stod.get("namn_ar"):
-            sprak_count["ar"] += 1
-        try:
-            ver = datetime.strptime(stod.get("senast_verifierad", ""), "%Y-%m-%d")
-            if datetime.now() - ver > timedelta(days=180):
-                inaktuella += 1
-        except ValueError:
-            inaktuella += 1
+    Args:
+        format: "markdown" (standard) eller "json".
+    """
+    fel = okant_format(format)
+    if fel:
+        return fel
+    if format == "json":
+        return till_json(matvarden.data())
+    return formatera_matvarden(matvarden.data())
 
-    kat_str = "\n".join(f"  - {k}: {v}" for k, v in sorted(kategorier.items()))
-    mg_str = "\n".join(f"  - {k}: {v}" for k, v in sorted(malgrupper.items()))
-    myn_str = "\n".join(f"  - {k}: {v}" for k, v in sorted(myndigheter.items()))
 
-    return (
-        f"# Stödlotsen — Databasstatistik\n\n"
-        f"**Totalt:** {len(alla_stod)} stöd\n"
-        f"**Regionala:** {regionala}\n"
-        f"**Potentiellt inaktuella:** {inaktuella}\n"
-        f"**Översatta till engelska:** {sprak_count['en']}\n"
-        f"**Översatta till arabiska:** {sprak_count['ar']}\n\n"
-        f"## Per kategori\n{kat_str}\n\n"
-        f"## Per målgrupp\n{mg_str}\n\n"
-        f"## Per myndighet\n{myn_str}"
-    )
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    """Mätvärden i Prometheus textformat (bara i webbläge)."""
+    return PlainTextResponse(matvarden.prometheus(), media_type="text/plain; version=0.0.4")
 
 
 # ── Kör servern ───────────────────────────────────────────────────
@@ -1461,7 +3936,7 @@ if __name__ == "__main__":
     if "--web" in sys.argv or os.environ.get("PORT"):
         # Webbläge — för deployment på Render/Vercel/etc.
         # Nås via URL som MCP-connector i Claude.ai
-        print(f"🧭 Stödlotsen startar i webbläge på port {port}...")
+        print(f"🧭 Stödlotsen startar i webbläge på port {port}... (mätvärden på /metrics)")
         mcp.run(transport="streamable-http")
     else:
         # Lokalt läge — för Claude Desktop / Claude Code
@@ -7,13 +7,22 @@ Kör: python test_standalone.py
 Testar alla 4 verktyg direkt via funktionsanrop.
 """
 
+import json
 import sys
 import os
+import tempfile
+import time
+import unicodedata
+from datetime import date, timedelta
+from pathlib import Path
 
 # Lägg till rätt sökväg
 sys.path.insert(0, os.path.dirname(__file__))
 
-from server import sok_stod, stod_detaljer, lista_stod, stod_statistik
+from server import sok_stod, sok_stod_batch, stod_detaljer, stod_detaljer_flera, lista_stod, stod_statistik, stod_matvarden
+from server import Aktualitet, Forrendering, Frasmatchare, Histogram, Katalog, Rangordning, Resultatcache, TermDokumentMatris, verifierings_flagga
+from server import Fragelogg, anonymisera_fraga, berakna_relevans, forrendering, katalog, ladda_stod, las_cursor, matvarden, np
+from server import skapa_cursor, sok, sok_cache, svensk_stam
 
 GREEN = "\033[92m"
 RED = "\033[91m"
@@ -87,6 +96,13 @@ tests_passed += test(
     r, lambda x: len(x) > 50
 )
 
+tests_total += 1
+r = sok_stod("والمُسَاعَدَة", sprak="ar")
+tests_passed += test(
+    "AR: 'والمُسَاعَدَة' (prefix + harakat) → assistansersättning via index?",
+    r, lambda x: "fk-assistansersattning" in x and x == sok_stod("مساعدة", sprak="ar")
+)
+
 # Filtrering
 tests_total += 1
 r = sok_stod("investering", malgrupp="Företag")
@@ -103,6 +119,56 @@ tests_passed += test(
     r, lambda x: "ästernorrland" in x or "nvestering" in x
 )
 
+tests_total += 1
+r = sok_stod_batch([
+    {"fraga": "ensamstående mamma hyra"},
+    {"fraga": "anställa", "malgrupp": "business", "sprak": "en"},
+    {"fraga": "ensamstående mamma hyra"},
+    {"fraga": "hyra", "rankning": "finns-inte"},
+])
+svar = json.loads(r)["sokningar"]
+tests_passed += test(
+    "sok_stod_batch: egna filter/språk per sökning, fel per sökning?",
+    r, lambda x: svar[0]["resultat"][0]["id"] == "fk-bostadsbidrag"
+    and svar[0] == svar[2]
+    and svar[1]["resultat"][0]["namn"] == "New start jobs"
+    and "Okänd rankning" in svar[3]["fel"]
+)
+
+tests_total += 1
+r = sok_stod_batch([{"fraga": "hyra", "malgrupp": None}, {"fraga": None}, "hyra", {"fraga": ["hyra"]}])
+svar = json.loads(r)["sokningar"]
+tests_passed += test(
+    "sok_stod_batch: null som saknat fält, fel per ogiltig sökning i stället för undantag?",
+    r, lambda x: svar[0]["antal"] > 0 and all("fel" in s for s in svar[1:])
+    and "fel" in json.loads(sok_stod_batch([{"fraga": "hyra"}] * 1001))
+)
+
+tests_total += 1
+topp_batch = [s["resultat"][0]["id"] for s in json.loads(sok_stod_batch([{"fraga": q} for q in ("dyr hyra", "sjukskriven", "vabba")]))["sokningar"]]
+topp_enskild = [sok_stod(q).split("**ID:** ")[1].split("\n")[0] for q in ("dyr hyra", "sjukskriven", "vabba")]
+tests_passed += test(
+    "sok_stod_batch: samma toppträff som sok_stod?",
+    topp_batch, lambda x: x == topp_enskild
+)
+
+tests_total += 1
+r = sok_stod("ensamstående mamma hyra", sprak="en", format="json")
+tests_passed += test(
+    "JSON: sok_stod → id, poäng, lokaliserat namn och flagga?",
+    r, lambda x: json.loads(x)["resultat"][0]["id"] == "fk-bostadsbidrag"
+    and json.loads(x)["resultat"][0]["namn"] == "Housing allowance"
+    and json.loads(x)["resultat"][0]["poang"] > 0
+    and isinstance(json.loads(x)["resultat"][0]["inaktuell"], bool)
+)
+
+tests_total += 1
+r = sok_stod("hyra", format="xml")
+tests_passed += test(
+    "JSON: okänt format → felmeddelande?",
+    r, lambda x: "Okänt format" in x and "json" in x
+)
+
 # ── 2. stod_detaljer ────────────────────────────────────────────
 
 header("2. stod_detaljer – hämta fullständig info")
@@ -128,10 +194,51 @@ tests_passed += test(
     r, lambda x: "ittar" in x.lower() or "inte" in x.lower()
 )
 
+tests_total += 1
+r = stod_detaljer(" FK_Bostadsbidrag ")
+tests_passed += test(
+    "Detaljer: skiftläge/understreck i ID → hittar stödet?",
+    r, lambda x: x == stod_detaljer("fk-bostadsbidrag")
+)
+
+tests_total += 1
+r = stod_detaljer_flera(["fk-bostadsbidrag", "finns-inte-123", "fk-underhallsstod"], sprak="en")
+tests_passed += test(
+    "Detaljer flera: tre ID:n → två stöd + ett felmeddelande?",
+    r, lambda x: x.count("\n---\n") == 2 and "ousing" in x and "aintenance" in x and "finns-inte-123" in x
+)
+
+tests_total += 1
+r = stod_detaljer_flera(["fk-bostadsbidrag", "finns-inte"], sprak="ar", format="json")
+tests_passed += test(
+    "JSON: stod_detaljer_flera → villkor för kända, fel för okända ID?",
+    r, lambda x: json.loads(x)[0]["namn"] == "بدل السكن" and json.loads(x)[0]["villkor"]
+    and "fel" in json.loads(x)[1]
+)
+
+tests_total += 1
+r = stod_detaljer("fk-bostadsbidrag", sprak="ar")
+tests_passed += test(
+    "Etiketter: arabiska etiketter och varning, inga svenska/engelska?",
+    r, lambda x: "الشروط" in x and "المبلغ" in x and "Requirements" not in x and "Villkor" not in x
+    and "Informationen kan vara" not in x
+)
+
+tests_total += 1
+r = stod_detaljer("finns-inte", sprak="ar")
+tests_passed += test(
+    "Etiketter: okänt ID på arabiska?",
+    r, lambda x: "finns-inte" in x and "Hittade inget" not in x
+)
+
 # ── 3. lista_stod ───────────────────────────────────────────────
 
 header("3. lista_stod – lista alla")
 
+# Listorna renderas i bakgrunden när katalogen laddats
+if forrendering.trad is not None:
+    forrendering.trad.join()
+
 tests_total += 1
 r = lista_stod()
 tests_passed += test(
@@ -153,6 +260,22 @@ tests_passed += test(
     r, lambda x: "hild" in x or "ousing" in x or "allowance" in x.lower()
 )
 
+tests_total += 1
+r = lista_stod(malgrupp="Business", sprak="en")
+tests_passed += test(
+    "Lista: förrenderad text återanvänds mellan anrop?",
+    r, lambda x: x is lista_stod(malgrupp="företag", sprak="en") and "filtered: företag" in x
+)
+
+tests_total += 1
+r = lista_stod(malgrupp="business", format="json")
+tests_passed += test(
+    "JSON: lista_stod för företag → samma antal som texten, förrenderad?",
+    r, lambda x: json.loads(x)["antal"] == len(json.loads(x)["stod"])
+    and f"Totalt {json.loads(x)['antal']} stöd" in lista_stod(malgrupp="business")
+    and x is lista_stod(malgrupp="business", format="json")
+)
+
 # ── 4. stod_statistik ───────────────────────────────────────────
 
 header("4. stod_statistik – databasöversikt")
@@ -164,6 +287,506 @@ tests_passed += test(
     r, lambda x: "29" in x and "ategori" in x.lower()
 )
 
+tests_total += 1
+r = stod_statistik()
+tests_passed += test(
+    "Statistik: förrenderad text återanvänds mellan anrop?",
+    r, lambda x: x is stod_statistik()
+)
+
+tests_total += 1
+r = stod_statistik(format="json")
+tests_passed += test(
+    "JSON: statistik → totalt och per kategori?",
+    r, lambda x: json.loads(x)["totalt"] == 29 and sum(json.loads(x)["per_kategori"].values()) == 29
+)
+
+f = Forrendering()
+f.statistik(katalog.hamta(), "markdown")
+tests_total += 1
+tests_passed += test(
+    "Förrendering: statistik renderar inte listorna, som byggs i bakgrunden?",
+    f.lista(katalog.hamta(), "", "sv", "markdown") or "ingen lista", lambda x: x == "ingen lista" and f.trad is not None
+    and (f.trad.join() or f.lista(katalog.hamta(), "", "sv", "markdown")) == lista_stod()
+)
+
+# ── 5. Katalog ──────────────────────────────────────────────────
+
+header("5. Katalog – inläsning och omladdning")
+
+with tempfile.TemporaryDirectory() as tmp:
+    fil = Path(tmp) / "stod.json"
+    fil.write_text(json.dumps(ladda_stod()[:3]), encoding="utf-8")
+    kat = Katalog(fil, [])
+    v1 = kat.hamta()
+
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: samma objekt vid oförändrad fil?",
+        v1.version, lambda x: kat.hamta() is v1
+    )
+
+    fil.write_text(json.dumps(ladda_stod()[:5]), encoding="utf-8")
+    os.utime(fil, ns=(0, 10**9))
+    v2 = kat.hamta()
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: ändrad fil → ny version?",
+        v2.version, lambda x: x != v1.version and len(v2.stod) == 5
+    )
+
+    fil.write_text("[{", encoding="utf-8")
+    os.utime(fil, ns=(0, 2 * 10**9))
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: halvskriven fil → behåller föregående version?",
+        kat.hamta().version, lambda x: x == v2.version
+    )
+
+    laddningar = kat.laddningar
+    fil.write_text(json.dumps([{"id": "utan-belopp", "namn": "Stöd utan belopp"}]), encoding="utf-8")
+    os.utime(fil, ns=(0, 3 * 10**9))
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: stöd som inte går att bygga → behåller föregående version?",
+        kat.hamta().version, lambda x: x == v2.version and kat.senaste_fel is not None
+    )
+
+    kat._bygg = None  # ett nytt byggförsök skulle krascha
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: trasig fil läses inte om förrän den ändras?",
+        [kat.hamta().version for _ in range(3)], lambda x: x == [v2.version] * 3 and kat.laddningar == laddningar
+    )
+    del kat._bygg
+
+    kat._las.acquire()  # som om en annan tråd byggde om
+    fil.write_text(json.dumps(ladda_stod()[:4]), encoding="utf-8")
+    os.utime(fil, ns=(0, 4 * 10**9))
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: under ombyggnad får anropen föregående version utan att vänta?",
+        kat.hamta().version, lambda x: x == v2.version
+    )
+    kat._las.release()
+    tests_total += 1
+    tests_passed += test(
+        "Katalog: giltig fil efter trasig → ny version?",
+        kat.hamta(), lambda x: len(x.stod) == 4 and kat._trasig is None
+    )
+
+# ── 6. Sökindex ─────────────────────────────────────────────────
+
+header("6. Sökindex – samma poäng som berakna_relevans")
+
+version = katalog.hamta()
+fragor = [
+    "ensamstående mamma hyra",
+    "jag har svårt att betala hyran",
+    "starta företag arbetslös ånge",
+    "ung student deltid",
+    "investera i ny maskin",
+    "sjukskriven utbränd",
+]
+avvikelser = []
+for fraga in fragor:
+    sokord = set(fraga.split())
+    forvantat = {i: berakna_relevans(s, fraga, sokord) for i, s in enumerate(version.stod)}
+    forvantat = {i: p for i, p in forvantat.items() if p > 0}
+    if version.index.poang(version.analysator.analysera_fraga(fraga, utoka=False)) != forvantat:
+        avvikelser.append(fraga)
+
+tests_total += 1
+tests_passed += test(
+    "Index: identiska poäng för alla stöd och frågor?",
+    avvikelser or "ok", lambda x: x == "ok"
+)
+
+tests_total += 1
+r = Frasmatchare(["he", "she", "his", "hers", "dyr hyra"]).sok("ushers med dyr hyra")
+tests_passed += test(
+    "Frasmatchare: överlappande fraser hittas i ett svep?",
+    r, lambda x: sorted(x) == [(3, "he"), (3, "she"), (5, "hers"), (18, "dyr hyra")]
+)
+
+tests_total += 1
+r = sok_stod(unicodedata.normalize("NFD", "ENSAMSTÅENDE Förälder"))
+tests_passed += test(
+    "Normalisering: versaler + NFD-tecken → samma resultat?",
+    r, lambda x: x == sok_stod("ensamstående förälder")
+)
+
+if np is not None:
+    matris = TermDokumentMatris(version.index, len(version.stod))
+    analyser = [version.analysator.analysera_fraga(f) for f in fragor]
+    avvikelser = [
+        a.text for a in analyser
+        if {d: round(p, 9) for d, p in matris.poang(version.index.fragevikter(a)).items()}
+        != {d: round(p, 9) for d, p in version.index.poang(a).items()}
+    ]
+    tests_total += 1
+    tests_passed += test(
+        "NumPy: term–dokument-matris ger samma poäng som indexet?",
+        avvikelser or "ok", lambda x: x == "ok"
+    )
+else:
+    print("  – NumPy saknas, hoppar över test av term–dokument-matrisen")
+
+urval = version.filter.urval("företag", "investering", "västernorrland")
+forvantat = [
+    i for i, n in enumerate(version.normaliserat)
+    if "företag" in n.malgrupp and n.kategori == "investering" and "västernorrland" in n.region
+]
+tests_total += 1
+tests_passed += test(
+    "Filterindex: företag + investering + Västernorrland → samma urval som skanning?",
+    list(urval), lambda x: x == forvantat and len(urval) == len(forvantat) and forvantat[0] in urval
+)
+
+tests_total += 1
+r = [svensk_stam(o) for o in ("hyror", "kostnader", "barnen", "studenter")]
+tests_passed += test(
+    "Stemmer: hyror/kostnader/barnen/studenter → hyr/kostnad/barn/student?",
+    r, lambda x: x == ["hyr", "kostnad", "barn", "student"]
+)
+
+tests_total += 1
+r = sok_stod("hyror")
+tests_passed += test(
+    "Stam: 'hyror' → bostadsbidrag via ordstammen?",
+    r, lambda x: x.split("### ")[1].startswith("Bostadsbidrag")
+)
+
+tests_total += 1
+r = version.analysator.delar("bostadskostnader")
+tests_passed += test(
+    "Orddelning: 'bostadskostnader' → bostad + kostnad?",
+    r, lambda x: x == (svensk_stam("bostad"), "kostnad")
+)
+
+tests_total += 1
+start = time.perf_counter()
+r = version.analysator.analysera_fraga("x" * 5000)
+tests_passed += test(
+    "Orddelning: mycket långt ord delas och stammas inte, utan att ta tid?",
+    str(time.perf_counter() - start), lambda x: float(x) < 0.1
+    and version.analysator.delar("x" * 5000) == ()
+)
+
+tests_total += 1
+r = sok_stod("bostadbidrag")
+tests_passed += test(
+    "Stavning: 'bostadbidrag' → bostadsbidrag, med rättningen utskriven?",
+    r, lambda x: "bostadbidrag → bostadsbidrag" in x and x.split("### ")[1].startswith("Bostadsbidrag")
+)
+
+tests_total += 1
+r = [version.analysator.rattning(o) for o in ("ensamstende", "sjukskrivn", "bostadsbidrag", "vill")]
+tests_passed += test(
+    "Stavning: rättar bara okända ord inom tillåtet avstånd?",
+    r, lambda x: x == ["ensamstående", "sjukskriven", None, None]
+)
+
+tests_total += 1
+langt = "".join(chr(ord("a") + (i * 7919) % 26) for i in range(1500))
+start = time.perf_counter()
+r = version.analysator.stavning.ratta(langt)
+tests_passed += test(
+    "Stavning: mycket långt ord rättas inte och tar ingen tid?",
+    str(time.perf_counter() - start), lambda x: r is None and float(x) < 0.05
+)
+
+tests_total += 1
+topp = lambda svar: [s.split("\n")[0] for s in svar.split("### ")[1:3]]
+r = sok_stod("ensamstaende foraldrar")
+tests_passed += test(
+    "Vikning: 'ensamstaende foraldrar' → samma topp 2 som med å/ä/ö, utan rättning?",
+    r, lambda x: "Rättad stavning" not in x and topp(x) == topp(sok_stod("ensamstående föräldrar"))
+)
+
+tests_total += 1
+a = version.analysator.analysera_fraga("ensamstaende")
+b = version.analysator.analysera_fraga("ensamstående")
+tests_passed += test(
+    "Vikning: vikt träff ger lägre poäng än exakt?",
+    version.index.poang(a) or "inga träffar",
+    lambda x: x != "inga träffar" and max(x.values()) < max(version.index.poang(b).values())
+)
+
+tests_total += 1
+r = sok_stod("single parent rent help", sprak="en")
+tests_passed += test(
+    "Synonymer: 'single parent rent help' → bostadsbidrag först?",
+    r, lambda x: x.split("### ")[1].startswith("Housing allowance")
+)
+
+tests_total += 1
+r = [version.analysator.synonymer_i(q) for q in ("vabba", "في الإيجار", "parenthood")]
+tests_passed += test(
+    "Synonymer: vardagligt och arabiskt ord översätts, bara hela ord?",
+    r, lambda x: x == [["vab"], ["hyra"], []]
+)
+
+tests_total += 1
+r = [k for k in version.analysator.synonymer if version.analysator.analysera_fraga(k).rattningar]
+tests_passed += test(
+    "Synonymer: inget ord ur synonymtabellen stavningsrättas?",
+    r or "inga", lambda x: x == "inga" and "education →" not in sok_stod("adult education", sprak="en")
+)
+
+# ── 7. Rankning ─────────────────────────────────────────────────
+
+header("7. Rankning – klassisk och BM25")
+
+tests_total += 1
+r = sok_stod("ensamstående mamma hyra", rankning="bm25")
+tests_passed += test(
+    "BM25: 'ensamstående mamma hyra' → bostadsbidrag först?",
+    r, lambda x: x.split("### ")[1].startswith("Bostadsbidrag")
+)
+
+tests_total += 1
+r = sok_stod("hyra", rankning="finns-inte")
+tests_passed += test(
+    "Okänd rankning → felmeddelande?",
+    r, lambda x: "Okänd rankning" in x and "bm25" in x
+)
+
+tests_total += 1
+poang = {dok: float(dok % 7) for dok in range(500)}
+forvantat = sorted(((p, d) for d, p in poang.items()), key=lambda x: (-x[0], x[1]))
+rang = Rangordning(("test",), poang)
+tests_passed += test(
+    "Topp-k: heap ger samma ordning som full sortering, lika poäng i katalogordning?",
+    rang.topp(10), lambda x: x == forvantat[:10] and rang.sida(10, 20) == forvantat[10:30]
+)
+
+tests_total += 1
+sida1 = json.loads(sok_stod("ensamstående barn hyra jobb", format="json", antal=3))
+sida2 = json.loads(sok_stod("ensamstående barn hyra jobb", format="json", antal=3, cursor=sida1["nasta"]))
+alla = json.loads(sok_stod("ensamstående barn hyra jobb", format="json", antal=6))
+tests_passed += test(
+    "Cursor: sida 1 + sida 2 = topp 6, och cursor knuten till sökningen?",
+    sida2, lambda x: [s["id"] for s in sida1["resultat"] + x["resultat"]] == [s["id"] for s in alla["resultat"]]
+    and x["start"] == 3
+    and "Ogiltig cursor" in sok_stod("hyra", cursor=sida1["nasta"])
+)
+
+tests_total += 1
+fore = Rangordning(("hyra", "", "", "", "klassisk"), {0: 1.0, 1: 0.5}, "v1")
+efter = Rangordning(("hyra", "", "", "", "klassisk"), {0: 1.0, 1: 0.5}, "v2")
+tests_passed += test(
+    "Cursor: cursor från en annan katalogversion avvisas?",
+    skapa_cursor(fore, 1), lambda x: las_cursor(x, fore) == 1 and las_cursor(x, efter) is None
+)
+
+def forklaring_summerar(svar):
+    data = json.loads(svar)
+    return data["resultat"] and all(
+        abs(sum(d["poang"] for d in r["forklaring"]) - r["poang"]) < 0.01 for r in data["resultat"]
+    )
+
+for rankning in ("klassisk", "bm25"):
+    tests_total += 1
+    r = sok_stod("ensamstaende mamma svårt att betala hyran", rankning=rankning, format="json", forklara=True)
+    tests_passed += test(
+        f"Förklaring ({rankning}): delarna summerar till poängen?",
+        r, forklaring_summerar
+    )
+
+tests_total += 1
+r = sok_stod("svårt att betala hyran", forklara=True)
+tests_passed += test(
+    "Förklaring: markdown med signal, sökord och tider per steg?",
+    r, lambda x: "## Förklaring" in x and '"svårt att betala hyran" ← hela termen: +3' in x
+    and all(steg in x for steg in ("laddning", "filter", "poang", "sortering", "rendering"))
+)
+
+# ── 8. Aktualitet ───────────────────────────────────────────────
+
+header("8. Aktualitet – verifieringsdatum")
+
+idag = date.today()
+akt = Aktualitet([
+    {"senast_verifierad": (idag - timedelta(days=179)).isoformat()},
+    {"senast_verifierad": (idag - timedelta(days=180)).isoformat()},
+    {"senast_verifierad": "okänt"},
+    {"senast_verifierad": idag.isoformat()},
+])
+tests_total += 1
+tests_passed += test(
+    "Aktualitet: 180 dagar eller ogiltigt datum → inaktuell?",
+    list(akt.inaktuella()), lambda x: x == [1, 2] and akt.flagga(0) == "" and akt.flagga(1) == " ⚠️"
+)
+
+tests_total += 1
+tests_passed += test(
+    "Aktualitet: verifierade sedan 179 dagar sedan → äldst först?",
+    akt.verifierade_sedan(idag - timedelta(days=179)), lambda x: x == [0, 3]
+)
+
+tests_total += 1
+tests_passed += test(
+    "Aktualitet: samma flagga som verifierings_flagga?",
+    "ok", lambda x: all(
+        version.aktualitet.flagga(dok) == verifierings_flagga(s) for dok, s in enumerate(version.stod)
+    )
+)
+
+# ── 9. Resultatcache ────────────────────────────────────────────
+
+header("9. Resultatcache – LRU med TTL")
+
+fore = sok_cache.statistik()
+sok_stod("Starta   EGET företag")
+sok_stod("starta eget företag")
+efter = sok_cache.statistik()
+tests_total += 1
+tests_passed += test(
+    "Cache: samma fråga med annat skiftläge/blanksteg → träff?",
+    str(efter), lambda x: efter["traffar"] == fore["traffar"] + 1 and efter["missar"] == fore["missar"] + 1
+)
+
+cache = Resultatcache(max_antal=2, ttl=60)
+for nyckel in ("a", "b", "c"):
+    cache.spara("v1", nyckel, nyckel)
+tests_total += 1
+tests_passed += test(
+    "Cache: full cache → äldsta utkastad?",
+    str(cache.statistik()), lambda x: cache.hamta("v1", "a") is None and cache.hamta("v1", "c") == "c" and cache.utkastade == 1
+)
+
+tests_total += 1
+tests_passed += test(
+    "Cache: ny katalogversion → cachen töms?",
+    str(cache.statistik()), lambda x: cache.hamta("v2", "c") is None and cache.statistik()["storlek"] == 0
+)
+
+cache = Resultatcache(max_antal=10, ttl=60, max_traffar=5)
+for nyckel, varde in (("a", "aa"), ("b", "bb"), ("c", "cc"), ("d", "dddddd")):
+    cache.spara("v1", nyckel, varde)
+tests_total += 1
+tests_passed += test(
+    "Cache: fler poängsatta träffar än max_traffar → äldsta utkastad, för stor post sparas inte?",
+    str(cache.statistik()), lambda x: cache.hamta("v1", "a") is None and cache.hamta("v1", "d") is None
+    and cache.hamta("v1", "c") == "cc" and cache.statistik()["traffar_i_cachen"] == 4
+)
+
+cache = Resultatcache(max_antal=2, ttl=0)
+cache.spara("v1", "a", "a")
+time.sleep(0.001)
+tests_total += 1
+tests_passed += test(
+    "Cache: utgången TTL → miss?",
+    str(cache.statistik()), lambda x: cache.hamta("v1", "a") is None and cache.utgangna == 1
+)
+
+# ── 10. Mätvärden ───────────────────────────────────────────────
+
+header("10. Mätvärden – anrop, svarstider och /metrics")
+
+tests_total += 1
+r = stod_matvarden(format="json")
+tests_passed += test(
+    "Mätvärden: anrop och träffar per verktyg räknas?",
+    r, lambda x: json.loads(x)["verktyg"]["sok_stod"]["anrop"] > 10
+    and json.loads(x)["verktyg"]["stod_detaljer"]["resultat_medel"] > 0
+    and json.loads(x)["katalog"]["laddningar"] >= 1
+)
+
+tests_total += 1
+r = matvarden.prometheus()
+tests_passed += test(
+    "Mätvärden: Prometheus-text med histogram och cache?",
+    r, lambda x: 'stodlotsen_tool_calls_total{tool="sok_stod"}' in x
+    and 'stodlotsen_tool_latency_seconds_bucket{tool="sok_stod",le="+Inf"}' in x
+    and "stodlotsen_cache_hits_total" in x
+)
+
+h = Histogram((1, 10))
+for varde in (0.5, 1, 5, 50):
+    h.registrera(varde)
+tests_total += 1
+tests_passed += test(
+    "Histogram: kumulativa hinkar och kvantil?",
+    str(h.kumulativ()), lambda x: h.kumulativ() == [(1, 2), (10, 3), (float("inf"), 4)] and h.kvantil(0.5) == 1
+)
+
+# ── 11. Frågelogg ───────────────────────────────────────────────
+
+header("11. Frågelogg – anonymiserad JSONL med rotation")
+
+tests_total += 1
+r = anonymisera_fraga("Jag heter Anna och bor i Ånge, ring 070-123 45 67 eller anna@example.com", katalog.hamta().analysator)
+tests_passed += test(
+    "Frågelogg: namn, nummer och e-post tas bort men inte ortnamn?",
+    r, lambda x: x == "jag heter <namn> och bor i ånge, ring <nummer> eller <epost>"
+)
+
+tests_total += 1
+r = [anonymisera_fraga(q, katalog.hamta().analysator)
+     for q in ("Ahmed har svårt med hyran", "Mohammed. Ensamstående pappa", "jag heter ahmed andersson", "اسمي احمد محمد")]
+tests_passed += test(
+    "Frågelogg: namn först i meningen, med liten bokstav och på arabiska tas bort?",
+    r, lambda x: x == ["<namn> har svårt med hyran", "<namn>. ensamstående pappa", "jag heter <namn> <namn>", "اسمي <namn> <namn>"]
+)
+
+with tempfile.TemporaryDirectory() as tmp:
+    logg = Fragelogg(Path(tmp) / "fragor.jsonl", max_storlek=600, antal_filer=2)
+    version = katalog.hamta()
+    _, resultat = sok(version, "dyr hyra")
+    for i in range(8):
+        logg.logga(version, "dyr hyra", ("", "", ""), "sv", "klassisk", resultat, 0, 3, 0.001)
+        logg.tom()
+    filer = sorted(p.name for p in Path(tmp).iterdir())
+    post = json.loads((Path(tmp) / "fragor.jsonl").read_text(encoding="utf-8").splitlines()[-1])
+    tests_total += 1
+    tests_passed += test(
+        "Frågelogg: poster med träffar skrivs och filen roteras?",
+        str(filer), lambda x: filer == ["fragor.jsonl", "fragor.jsonl.1", "fragor.jsonl.2"]
+        and post["fraga"] == "dyr hyra" and post["ids"] == [version.stod[d]["id"] for _, d in resultat.topp(3)]
+    )
+
+    # Loggsökvägen är en katalog: skrivningen misslyckas men tråden ska fortsätta
+    trasig = Fragelogg(Path(tmp), max_storlek=10_000, antal_filer=1, intervall=0.01)
+    trasig.logga(version, "dyr hyra", ("", "", ""), "sv", "klassisk", resultat, 0, 3, 0.001)
+    for _ in range(200):
+        if trasig.fel:
+            break
+        time.sleep(0.01)
+    trasig.fil = Path(tmp) / "ny" / "fragor.jsonl"
+    for _ in range(200):
+        if trasig.skrivna:
+            break
+        time.sleep(0.01)
+    tests_total += 1
+    tests_passed += test(
+        "Frågelogg: skrivfel räknas, posten läggs tillbaka och loggningen fortsätter?",
+        str(trasig.statistik()), lambda x: trasig.fel >= 1 and trasig.skrivna == 1 and trasig._trad.is_alive()
+    )
+
+# ── 12. Relevans ────────────────────────────────────────────────
+
+header("12. Relevans – guldfrågor")
+
+from relevanstest import GULDFRAGOR, las_guldfragor, skatta_index, skatta_linjart, utvardera
+
+guldfragor = las_guldfragor(GULDFRAGOR)
+version = katalog.hamta()
+tests_total += 1
+tests_passed += test(
+    "Guldfrågor: alla förväntade ID:n finns i databasen?",
+    str(len(guldfragor)), lambda x: all(version.hitta(i) for f in guldfragor for i in f["relevanta"])
+)
+
+tests_total += 1
+ndcg_index = utvardera(version, guldfragor, skatta_index, 5, 1)["ndcg@5"]
+ndcg_linjar = utvardera(version, guldfragor, skatta_linjart, 5, 1)["ndcg@5"]
+tests_passed += test(
+    f"Guldfrågor: indexets NDCG@5 ({ndcg_index:.3f}) minst berakna_relevans ({ndcg_linjar:.3f})?",
+    str(ndcg_index), lambda x: ndcg_index >= ndcg_linjar
+)
+
 # ── Sammanfattning ───────────────────────────────────────────────
 
 header("RESULTAT")